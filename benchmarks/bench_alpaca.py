@@ -0,0 +1,53 @@
+"""
+Alpaca transport benchmark against the stand-in Alpaca server: image transfer throughput of ImageBytes against JSON
+and property reads per second over the keep-alive connection pool.
+
+Usage: python benchmarks/bench_alpaca.py [size ...]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from chimera_ascom.sim.alpaca import AlpacaServer
+from chimera_ascom.util.readout import ImageReader
+from chimera_ascom.util.transport import AlpacaDevice, ConnectionPool
+
+
+class BenchCamera(object):
+    CCDTemperature = -20.0
+
+    def __init__(self, size):
+        self.ImageArray = np.random.randint(0, 65535, (size, size)).astype(np.int32)
+
+
+def main(sizes, reads=1000):
+    print "%6s %-10s %8s %10s" % ("size", "format", "time(s)", "MB/s")
+    for size in sizes:
+        server = AlpacaServer({("camera", 0): BenchCamera(size)}).start()
+        host, port = server.address.split(":")
+        pool = ConnectionPool(host, int(port))
+        for imagebytes in (True, False):
+            camera = AlpacaDevice(pool, "camera", imagebytes=imagebytes)
+            t0 = time.time()
+            ImageReader(np.uint16).read(camera)
+            elapsed = time.time() - t0
+            print "%6d %-10s %8.3f %10.1f" % (size, "imagebytes" if imagebytes else "json", elapsed,
+                                             size * size * 2 / 1e6 / elapsed)
+        pool.close()
+        server.stop()
+
+    server = AlpacaServer({("camera", 0): BenchCamera(1)}).start()
+    host, port = server.address.split(":")
+    for name, pool_size in (("keep-alive", 4), ("no pooling", 0)):
+        camera = AlpacaDevice(ConnectionPool(host, int(port), size=pool_size), "camera")
+        t0 = time.time()
+        for i in range(reads):
+            camera.CCDTemperature
+        print "%-10s %8.1f property reads/s" % (name, reads / (time.time() - t0))
+    server.stop()
+
+
+if __name__ == '__main__':
+    main([int(s) for s in sys.argv[1:]] or [512, 1024, 2048])
@@ -0,0 +1,50 @@
+"""
+Frame statistics benchmark: cost of frame_stats per megapixel on synthetic uint16 frames.
+
+Each frame has a flat background with gaussian noise, a few gaussian stars and saturated hot pixels, brighter than
+the stars, which the FWHM measurement must skip. The measured FWHM is printed next to the true one.
+
+Usage: python benchmarks/bench_frame_stats.py [size ...]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from chimera_ascom.util.framestats import frame_stats
+
+SIGMA = 2.  # pixels, of the stars
+
+
+def synthetic_frame(size, background=1000., noise=10., saturation=65535):
+    rng = np.random.RandomState(42)
+    frame = rng.normal(background, noise, (size, size))
+    y, x = np.mgrid[-10:11, -10:11]
+    star = np.exp(-(x ** 2 + y ** 2) / (2 * SIGMA ** 2))
+    for flux in (40000., 5000., 2000., 1000.):
+        cy, cx = rng.randint(20, size - 20, 2)
+        frame[cy - 10:cy + 11, cx - 10:cx + 11] += flux * star
+    hot = rng.randint(0, size, (2, 20))
+    frame[hot[0], hot[1]] = saturation
+    return np.clip(frame, 0, saturation).astype(np.uint16)
+
+
+def main(sizes, repeat=5):
+    print "%6s %8s %10s %10s %8s %8s" % ("size", "MPix", "time(ms)", "ms/MPix", "FWHM", "true")
+    for size in sizes:
+        frame = synthetic_frame(size)
+        times = []
+        for i in range(repeat):
+            t0 = time.time()
+            stats = frame_stats(frame, saturation=65535)
+            times.append(time.time() - t0)
+        best = min(times)
+        mpix = frame.size / 1e6
+        print "%6d %8.2f %10.2f %10.2f %8s %8.2f" % (size, mpix, best * 1e3, best * 1e3 / mpix,
+                                                    "%.2f" % stats["fwhm"] if stats["fwhm"] else "-",
+                                                    2.3548 * SIGMA)
+
+
+if __name__ == '__main__':
+    main([int(s) for s in sys.argv[1:]] or [256, 1024, 2048, 4096])
@@ -0,0 +1,153 @@
+"""
+Instrument benchmark on the simulated devices (``transport: sim``), so it runs on any platform: latency, CPU time and
+driver calls of the main operation of every instrument, and frames per second of camera sequences.
+
+Results are compared with the baseline stored by ``--save`` under benchmarks/baselines/, the run fails if an
+operation got slower, or does more driver calls, than the baseline.
+
+Usage: python benchmarks/bench_instruments.py [--save] [--baseline NAME] [--latency SECONDS] [--repeat N]
+"""
+
+import os
+import sys
+import json
+import time
+import optparse
+import tempfile
+
+from chimera.core.manager import Manager
+from chimera.controllers.imageserver.imageserver import ImageServer
+from chimera.interfaces.camera import Shutter
+from chimera.util.position import Position
+
+from chimera_ascom.instruments.ascomcamera import ASCOMCamera
+from chimera_ascom.instruments.ascomfilterwheel import ASCOMFilterWheel
+from chimera_ascom.instruments.ascomfocuser import ASCOMFocuser
+from chimera_ascom.instruments.ascomtelescope import ASCOMTelescope
+from chimera_ascom.sim import devices as sim_devices
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+#: relative and absolute (seconds) latency increase allowed over the baseline.
+TOLERANCE = 0.25
+ABSOLUTE_TOLERANCE = 0.005
+
+SEQUENCE_FRAMES = 10
+
+devices = {}
+
+
+def install(latency):
+    """
+    Makes the "sim" transport create benchmark devices with ``latency`` seconds per driver call.
+    """
+    def factory(device_type, cls, **kwargs):
+        def create():
+            devices[device_type] = cls(latency=latency, **kwargs)
+            return devices[device_type]
+        return create
+
+    sim_devices.factories.update(
+        telescope=factory("telescope", sim_devices.SimTelescope, slew_rate=30.),
+        camera=factory("camera", sim_devices.SimCamera, size=(1024, 1024), readout_time=0.2),
+        focuser=factory("focuser", sim_devices.SimFocuser, speed=5000.),
+        filterwheel=factory("filterwheel", sim_devices.SimFilterWheel, slot_time=0.1))
+
+
+def measure(device_type, func, *args):
+    device = devices[device_type]
+    device.reset()
+    cpu0 = sum(os.times()[:2])
+    t0 = time.time()
+    func(*args)
+    return {"latency": time.time() - t0, "cpu": sum(os.times()[:2]) - cpu0, "calls": device.call_count()}
+
+
+def median(results):
+    middle = len(results) / 2
+    return dict((key, sorted(r[key] for r in results)[middle]) for key in results[0])
+
+
+def run(repeat):
+    manager = Manager(port=9090)
+    try:
+        manager.addClass(ImageServer, "imageserver")
+        # a new capability profile each run, so that every run is a cold start
+        config = {"transport": "sim", "profile_file": os.path.join(tempfile.mkdtemp(), "profiles.json")}
+        camera = manager.addClass(ASCOMCamera, "camera", config)
+        telescope = manager.addClass(ASCOMTelescope, "telescope", config)
+        focuser = manager.addClass(ASCOMFocuser, "focuser", config)
+        wheel = manager.addClass(ASCOMFilterWheel, "filterwheel", dict(config, filters="U B V R I"))
+
+        targets = [Position.fromRaDec("03:00:00", "-30:00:00"), Position.fromRaDec("05:00:00", "-20:00:00")]
+        operations = [
+            ("camera.expose", "camera", lambda i: camera.expose(exptime=0.01, frames=1, shutter=Shutter.OPEN)),
+            ("camera.exposeSequence", "camera",
+             lambda i: camera.exposeSequence(exptime=0.01, frames=SEQUENCE_FRAMES, shutter=Shutter.OPEN)),
+            ("telescope.slewToRaDec", "telescope", lambda i: telescope.slewToRaDec(targets[i % 2])),
+            ("focuser.moveTo", "focuser", lambda i: focuser.moveTo(24000 + 2000 * (i % 2))),
+            ("filterwheel.setFilter", "filterwheel", lambda i: wheel.setFilter("BR"[i % 2]))]
+
+        results = {}
+        for name, device_type, operation in operations:
+            results[name] = median([measure(device_type, operation, i) for i in range(repeat)])
+        sequence = results["camera.exposeSequence"]
+        sequence["fps"] = SEQUENCE_FRAMES / sequence["latency"]
+        return results
+    finally:
+        manager.shutdown()
+
+
+def compare(results, baseline):
+    """
+    Prints the results against the baseline and returns the operations that regressed.
+    """
+    regressions = []
+    print "%-24s %10s %10s %8s %8s %12s" % ("operation", "latency(s)", "baseline", "cpu(s)", "calls", "calls base")
+    for name in sorted(results):
+        result, base = results[name], baseline.get(name)
+        if base is None:
+            print "%-24s %10.3f %10s %8.3f %8d %12s" % (name, result["latency"], "-", result["cpu"], result["calls"],
+                                                        "-")
+            continue
+        slower = result["latency"] > base["latency"] * (1 + TOLERANCE) + ABSOLUTE_TOLERANCE
+        if slower or result["calls"] > base["calls"]:
+            regressions.append(name)
+        print "%-24s %10.3f %10.3f %8.3f %8d %12d %s" % (name, result["latency"], base["latency"], result["cpu"],
+                                                         result["calls"], base["calls"],
+                                                         "REGRESSION" if name in regressions else "")
+    print "camera.exposeSequence: %.1f frames/s" % results["camera.exposeSequence"]["fps"]
+    return regressions
+
+
+def main():
+    parser = optparse.OptionParser(usage=__doc__.strip().splitlines()[-1])
+    parser.add_option("--save", action="store_true", help="store the results as the baseline")
+    parser.add_option("--baseline", default="default", help="baseline name [%default]")
+    parser.add_option("--latency", type="float", default=0.001, help="seconds per driver call [%default]")
+    parser.add_option("--repeat", type="int", default=3, help="runs of each operation [%default]")
+    options, args = parser.parse_args()
+
+    install(options.latency)
+    results = run(options.repeat)
+
+    path = os.path.join(BASELINES, "%s.json" % options.baseline)
+    baseline = {}
+    if os.path.exists(path):
+        with open(path) as f:
+            baseline = json.load(f)
+    regressions = compare(results, baseline)
+
+    if options.save:
+        if not os.path.isdir(BASELINES):
+            os.makedirs(BASELINES)
+        with open(path, "w") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print "Baseline saved to %s" % path
+    elif regressions:
+        print "Regressions: %s" % ", ".join(regressions)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
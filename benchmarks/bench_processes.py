@@ -0,0 +1,99 @@
+"""
+Multi-camera benchmark: FITS writes on threads against writes on worker processes (ProcessWriter).
+
+Each simulated camera converts nested tuples (the pywin32 ImageArray conversion) with ImageReader and hands the frame
+to its writer, like ASCOMCamera with fits_writer. Meanwhile a telescope thread polls every 10 ms; its wake-up delay
+shows how much the cameras hold the GIL. Runs 1, 2 and 4 cameras in each mode.
+
+Usage: python benchmarks/bench_processes.py [size [frames [compression]]]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+from chimera_ascom.util.fitswriter import write_fits
+from chimera_ascom.util.procwriter import ProcessWriter
+from chimera_ascom.util.readout import ImageReader
+from chimera_ascom.util.workers import WorkerPool
+
+POLL = 0.01
+
+
+class FakeCamera(object):
+    def __init__(self, size):
+        self.ImageArray = tuple(tuple(np.random.randint(0, 65535, size).tolist()) for _ in range(size))
+
+
+def telescope(stop, delays):
+    while not stop.isSet():
+        t0 = time.time()
+        time.sleep(POLL)
+        delays.append(time.time() - t0 - POLL)
+
+
+def camera(number, cam, frames, write, directory, latencies):
+    reader = ImageReader(np.uint16)
+    writer = WorkerPool("camera %d" % number, workers=1, depth=2)
+    jobs = []
+    for frame in range(frames):
+        t0 = time.time()
+        pix = reader.read(cam)
+        latencies.append(time.time() - t0)
+        jobs.append(writer.submit(write, os.path.join(directory, "cam%d-%d.fits" % (number, frame)), pix))
+    for job in jobs:
+        job.wait()
+    writer.shutdown()
+
+
+def run(cameras, size, frames, compression, processes):
+    directory = tempfile.mkdtemp()
+    fixtures = [FakeCamera(size) for i in range(cameras)]
+    pool = ProcessWriter("bench", size * size * 2, slots=2 * cameras, processes=cameras) if processes else None
+
+    def write(path, pix):
+        if pool is not None:
+            return pool.write(path, pix, compression=compression)
+        return write_fits(path, pix, compression=compression)
+
+    stop = threading.Event()
+    delays, latencies = [], []
+    poller = threading.Thread(target=telescope, args=(stop, delays))
+    poller.start()
+    t0 = time.time()
+    threads = [threading.Thread(target=camera, args=(i, fixtures[i], frames, write, directory, latencies))
+               for i in range(cameras)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.time() - t0
+    stop.set()
+    poller.join()
+    if pool is not None:
+        pool.close()
+    shutil.rmtree(directory)
+
+    delays = np.array(delays) * 1e3
+    return (np.median(latencies), wall, cameras * frames / wall, np.median(delays), np.percentile(delays, 99),
+            delays.max())
+
+
+def main(size=1024, frames=5, compression=None):
+    print "%-9s %7s %12s %8s %6s %16s %16s %14s" % ("mode", "cameras", "readout(s)", "wall(s)", "fps",
+                                                   "tel. p50(ms)", "tel. p99(ms)", "tel. max(ms)")
+    for processes in (False, True):
+        for cameras in (1, 2, 4):
+            result = run(cameras, size, frames, compression, processes)
+            print "%-9s %7d %12.3f %8.2f %6.2f %16.2f %16.2f %14.2f" % (("processes" if processes else "threads",
+                                                                         cameras) + result)
+
+
+if __name__ == '__main__':
+    args = sys.argv[1:]
+    main(int(args[0]) if args else 1024, int(args[1]) if len(args) > 1 else 5, args[2] if len(args) > 2 else None)
@@ -0,0 +1,62 @@
+"""
+Readout benchmark: old ``np.transpose(np.array(ImageArray))`` conversion against ImageReader.
+
+The driver is replaced by an object returning the same nested tuples pywin32 builds from the ImageArray SAFEARRAY,
+so it runs on any platform. Each case runs in its own process to report the peak RSS of a single frame.
+
+Usage: python benchmarks/bench_readout.py [size ...]
+"""
+
+import sys
+import time
+import resource
+import multiprocessing
+
+import numpy as np
+
+from chimera_ascom.util.readout import ImageReader
+
+
+class FakeCamera(object):
+    def __init__(self, size, raw=False):
+        # built column by column so that the fixture itself doesn't raise the peak RSS above its final size
+        if raw:
+            self.ImageArray = np.random.randint(0, 65535, (size, size)).astype(np.int32)
+        else:
+            self.ImageArray = tuple(tuple(np.random.randint(0, 65535, size).tolist()) for _ in range(size))
+
+
+def old_readout(cam):
+    return np.ascontiguousarray(np.transpose(np.array(cam.ImageArray)))
+
+
+def new_readout(cam):
+    return ImageReader(np.uint16).read(cam)
+
+
+def run(size, method, raw, queue):
+    cam = FakeCamera(size, raw)
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.time()
+    pix = method(cam)
+    elapsed = time.time() - t0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss0
+    queue.put((elapsed, pix.nbytes, pix.dtype.name, rss / 1024.))
+
+
+def main(sizes):
+    queue = multiprocessing.Queue()
+    print "%6s %-6s %-6s %8s %8s %10s %12s" % ("size", "method", "input", "dtype", "time(s)", "MB/s", "peak RSS(MB)")
+    for size in sizes:
+        for name, method in (("old", old_readout), ("new", new_readout)):
+            for raw in (False, True):
+                p = multiprocessing.Process(target=run, args=(size, method, raw, queue))
+                p.start()
+                elapsed, nbytes, dtype, rss = queue.get()
+                p.join()
+                print "%6d %-6s %-6s %8s %8.3f %10.1f %12.1f" % (size, name, "raw" if raw else "tuple", dtype,
+                                                                elapsed, size * size * 2 / 1e6 / elapsed, rss)
+
+
+if __name__ == '__main__':
+    main([int(s) for s in sys.argv[1:]] or [512, 1024, 2048, 4096])
@@ -0,0 +1,68 @@
+"""
+Readout mode benchmark against a real camera: for every readout mode (ASCOM ReadoutModes or FastReadout) and binning
+the camera reports, takes minimum exposure dark frames and measures the readout (StartExposure to ImageReady) and the
+image transfer times.
+
+Usage: python benchmarks/bench_readout_modes.py <ascom_id | alpaca host:port> [frames]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from chimera_ascom.util.readout import ImageReader, native_dtype, binning_table, readout_speeds
+from chimera_ascom.util.transport import dispatch
+
+
+def optional(camera, member, default):
+    try:
+        return getattr(camera, member)
+    except AttributeError:
+        return default
+
+
+def expose(camera, reader, exptime, shape):
+    t0 = time.time()
+    camera.StartExposure(exptime, False)
+    while not camera.ImageReady:
+        time.sleep(0.005)
+    t1 = time.time()
+    reader.read(camera, shape=shape)
+    return t1 - t0 - exptime, time.time() - t1
+
+
+def main(target, frames=3):
+    alpaca = ":" in target
+    camera = dispatch({"transport": "alpaca" if alpaca else "com", "ascom_id": target, "alpaca_server": target,
+                       "alpaca_device": 0, "alpaca_imagebytes": True}, "camera")
+    camera.Connected = True
+
+    exptime = optional(camera, "ExposureMin", 0.001)
+    width, height = camera.CameraXSize, camera.CameraYSize
+    reader = ImageReader(native_dtype(optional(camera, "MaxADU", None)))
+    speeds = readout_speeds(optional(camera, "ReadoutModes", None), optional(camera, "CanFastReadout", False))
+    binnings = binning_table(optional(camera, "MaxBinX", 1), optional(camera, "MaxBinY", 1))
+
+    print "%-20s %4s %-7s %11s %12s %10s" % ("mode", "fast", "binning", "readout(s)", "transfer(s)", "MPix/s")
+    for speed in speeds:
+        for member, value in speed["settings"].iteritems():
+            setattr(camera, member, value)
+        for name, bin_x, bin_y in binnings:
+            camera.BinX, camera.BinY = bin_x, bin_y
+            camera.StartX, camera.StartY = 0, 0
+            camera.NumX, camera.NumY = width / bin_x, height / bin_y
+            times = np.array([expose(camera, reader, exptime, (width / bin_x, height / bin_y))
+                              for i in range(frames)])
+            readout, transfer = times.mean(axis=0)
+            print "%-20s %4s %-7s %11.3f %12.3f %10.2f" % (speed["name"], "yes" if speed["fast"] else "", name,
+                                                            readout, transfer,
+                                                            width / bin_x * (height / bin_y) / 1e6 / readout)
+    camera.Connected = False
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print __doc__
+        sys.exit(1)
+    main(sys.argv[1], *[int(n) for n in sys.argv[2:3]])
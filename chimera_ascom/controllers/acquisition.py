@@ -0,0 +1,156 @@
+import time
+import logging
+import threading
+
+from chimera.core.chimeraobject import ChimeraObject
+from chimera.core.exceptions import ChimeraException
+from chimera.core.lock import lock
+
+from chimera_ascom.util.operation import Operation
+
+log = logging.getLogger(__name__)
+
+
+class AcquisitionError(ChimeraException):
+    pass
+
+
+class Acquisition(ChimeraObject):
+    """
+    Acquires a field moving the telescope, the filter wheel and the focuser at the same time, instead of one after
+    the other.
+    """
+
+    __config__ = {"telescope": "/Telescope/0",
+                  "filterwheel": "/FilterWheel/0",
+                  "focuser": "/Focuser/0",
+                  "focus_offsets": "",      # "filter:offset ...", by default the filter wheel getFocusOffsets
+                  "timeout": 180}           # seconds for the whole acquisition
+
+    def __init__(self):
+        ChimeraObject.__init__(self)
+        self._abort = threading.Event()
+        self._timeline = []
+
+    def getTelescope(self):
+        return self.getManager().getProxy(self["telescope"])
+
+    def getFilterWheel(self):
+        return self.getManager().getProxy(self["filterwheel"])
+
+    def getFocuser(self):
+        return self.getManager().getProxy(self["focuser"])
+
+    @lock
+    def acquire(self, position=None, filter=None, focus=None, timeout=None):
+        """
+        Slews to ``position``, changes to ``filter`` and moves the focuser to ``focus``, all at the same time, and
+        returns when every device is ready. Without ``focus``, the focuser is moved by the focus offset difference
+        between the current and the new filter. None leaves that device alone.
+
+        :param timeout: seconds for the whole acquisition, default: timeout option.
+        :raises AcquisitionError: if a device fails, the acquisition is aborted or takes longer than ``timeout``.
+            Every device still moving is then aborted.
+        """
+        timeout = self["timeout"] if timeout is None else timeout
+        self._abort.clear()
+        t0 = time.time()
+
+        if focus is None and filter is not None:
+            focus = self._offsetFocus(filter)
+
+        legs = []
+        if position is not None:
+            legs.append(("telescope", lambda: self.getTelescope().slewToRaDec(position)))
+        if filter is not None:
+            legs.append(("filterwheel", lambda: self.getFilterWheel().setFilter(filter)))
+        if focus is not None:
+            legs.append(("focuser", lambda: self.getFocuser().moveTo(focus)))
+
+        changed = threading.Event()
+        operations = []
+        for name, leg in legs:
+            operation = Operation("Acquisition %s" % name).run(leg)
+            operation.add_done_callback(lambda op: changed.set())
+            operations.append((name, operation))
+
+        error = None
+        while not all(operation.done() for name, operation in operations):
+            remaining = timeout - (time.time() - t0)
+            if remaining <= 0:
+                error = "not ready after %d s" % timeout
+                break
+            changed.wait(min(remaining, 1.))
+            changed.clear()
+            if self._abort.isSet():
+                error = "aborted"
+                break
+            failed = [name for name, operation in operations if self._failed(operation)]
+            if failed:
+                error = "%s failed" % ", ".join(failed)
+                break
+
+        if error is not None:
+            self._abortDevices([name for name, operation in operations if not operation.done()])
+
+        self._timeline = [{"leg": name, "start": operation.started - t0,
+                           "end": operation.finished - t0 if operation.done() else None,
+                           "duration": operation.elapsed if operation.done() else None,
+                           "result": operation.result, "error": str(operation.error) if operation.error else None}
+                          for name, operation in operations]
+        self._timeline.append({"leg": "acquisition", "start": 0., "end": time.time() - t0,
+                               "duration": time.time() - t0, "result": error is None, "error": error})
+        self.log.info("Acquisition %s after %.1f s." % ("done" if error is None else error, time.time() - t0))
+        for leg in self._timeline[:-1]:
+            self.log.debug("%(leg)s: %(start).1f s to %(end)s s, result %(result)s, error %(error)s" % leg)
+
+        if error is not None:
+            raise AcquisitionError("Acquisition %s." % error)
+        return True
+
+    def abort(self):
+        """
+        Aborts the running acquisition, stopping the devices that are still moving.
+        """
+        self._abort.set()
+
+    def getTimeline(self):
+        """
+        Returns the legs of the last acquisition as a list of {"leg", "start", "end", "duration" (seconds from the
+        start of the acquisition), "result", "error"}, the last one for the whole acquisition.
+        """
+        return self._timeline
+
+    def _failed(self, operation):
+        # instruments that don't report a result return None, only False is a failure
+        return operation.done() and (operation.error is not None or operation.result is False)
+
+    def _offsetFocus(self, filter):
+        # filter wheels take filter names in any case, offsets are keyed by the upper case name
+        offsets = self._focusOffsets()
+        filter, current = str(filter).upper(), str(self.getFilterWheel().getFilter()).upper()
+        if filter not in offsets or current not in offsets or offsets[filter] == offsets[current]:
+            return None
+        return self.getFocuser().getPosition() + offsets[filter] - offsets[current]
+
+    def _focusOffsets(self):
+        if self["focus_offsets"]:
+            offsets = (item.split(":") for item in self["focus_offsets"].split())
+        else:
+            try:
+                offsets = self.getFilterWheel().getFocusOffsets().items()
+            except AttributeError:  # not an ASCOM filter wheel
+                return {}
+        return dict((str(name).upper(), int(offset)) for name, offset in offsets)
+
+    def _abortDevices(self, legs):
+        aborts = {"telescope": lambda: self.getTelescope().abortSlew(),
+                  "focuser": lambda: self.getFocuser().abortMove()}
+        for leg in legs:
+            if leg not in aborts:
+                self.log.warning("%s can't be aborted, it will finish its move." % leg)
+                continue
+            try:
+                aborts[leg]()
+            except Exception, e:
+                self.log.error("Could not abort %s: %s" % (leg, e))
@@ -0,0 +1,223 @@
+import time
+import logging
+import threading
+import collections
+
+from chimera.core.chimeraobject import ChimeraObject
+from chimera.core.exceptions import ChimeraException
+from chimera.core.lock import lock
+
+from chimera_ascom.util.focusfit import FITS, FocusFitError
+from chimera_ascom.util.framestats import frame_stats
+
+log = logging.getLogger(__name__)
+
+
+class AutofocusError(ChimeraException):
+    pass
+
+
+class Autofocus(ChimeraObject):
+    """
+    Finds the best focus from subframes taken at a range of focuser positions. Frames are measured in memory
+    (ASCOMCamera.takeFrame) and the focuser starts moving to the next position before the current frame is
+    analysed.
+    """
+
+    __config__ = {"camera": "/ASCOMCamera/0",
+                  "focuser": "/ASCOMFocuser/0",
+                  "exptime": 2,
+                  "window": None,           # camera window of the focus star, None: found on a first full frame
+                  "subframe": 64,           # pixels of the window around the star found on the full frame
+                  "binning": None,
+                  "step": 100,              # focuser steps between samples
+                  "points": 9,              # samples of each run
+                  "fit": "hyperbola",       # hyperbola or vcurve
+                  "star_box": 21,           # pixels of the box the FWHM is measured in
+                  "runs": 20}               # runs kept by getRuns
+
+    def __init__(self):
+        ChimeraObject.__init__(self)
+        self._abort = threading.Event()
+        self._runs = None
+
+    def __start__(self):
+        self._runs = collections.deque(maxlen=self["runs"])
+
+    def getCamera(self):
+        return self.getManager().getProxy(self["camera"])
+
+    def getFocuser(self):
+        return self.getManager().getProxy(self["focuser"])
+
+    @lock
+    def focus(self, center=None, step=None, points=None, exptime=None, fit=None, move=True):
+        """
+        Samples ``points`` focuser positions ``step`` steps apart around ``center`` (default: current position),
+        fits the star size against position and, with ``move``, moves the focuser to the best position.
+
+        :return: the best focuser position.
+        :raises AutofocusError: if the fit fails or the run is aborted, the focuser is then moved back to where it
+            started.
+        """
+        step = step or self["step"]
+        points = points or self["points"]
+        exptime = self["exptime"] if exptime is None else exptime
+        fit = fit or self["fit"]
+        if fit not in FITS:
+            raise AutofocusError("Unknown focus fit '%s', use one of: %s." % (fit, ", ".join(sorted(FITS))))
+
+        camera = self.getCamera()
+        focuser = self.getFocuser()
+        start = focuser.getPosition()
+        center = start if center is None else center
+        low, high = focuser.getRange()
+        positions = [p for p in (center + (i - points // 2) * step for i in range(points)) if low <= p <= high]
+        if len(positions) < 3:
+            raise AutofocusError("Less than 3 focus positions around %d within the focuser range." % center)
+
+        self._abort.clear()
+        run = {"start": time.time(), "fit": fit, "window": None, "samples": [], "best": None, "fwhm": None,
+               "error": None}
+        times = collections.defaultdict(float)
+        done = False
+        try:
+            run["window"] = self["window"]
+            if run["window"] is None:
+                t0 = time.time()
+                run["window"] = self._findStar(camera, exptime)
+                times["exposure"] += time.time() - t0
+
+            t0 = time.time()
+            focuser.moveTo(positions[0], wait=False)
+            moved = self._checkMove(focuser, positions[0], focuser.waitMove())
+            times["move"] += time.time() - t0
+
+            for i, position in enumerate(positions):
+                if self._abort.isSet():
+                    raise AutofocusError("Autofocus aborted.")
+                t0 = time.time()
+                frame = camera.takeFrame(exptime, run["window"], self["binning"])
+                times["exposure"] += time.time() - t0
+
+                # the focuser moves to the next position while this frame is analysed
+                t0 = time.time()
+                if i < len(positions) - 1:
+                    focuser.moveTo(positions[i + 1], wait=False)
+                stats = frame_stats(frame, box=self["star_box"])
+                analysis = time.time() - t0
+                times["analysis"] += analysis
+                flag = moved
+                if i < len(positions) - 1:
+                    moved = self._checkMove(focuser, positions[i + 1], focuser.waitMove())
+                times["move"] += time.time() - t0 - analysis
+
+                run["samples"].append({"position": position, "fwhm": stats["fwhm"], "peak": stats["peak"],
+                                       "background": stats["background"], "star_x": stats["star_x"],
+                                       "star_y": stats["star_y"], "flag": flag, "analysis_time": analysis})
+                self.log.debug("Focus %d: FWHM %s" % (position, stats["fwhm"]))
+
+            measured = self._flagSamples(run["samples"])
+            try:
+                best, fwhm = FITS[fit]([s["position"] for s in measured], [s["fwhm"] for s in measured])
+            except FocusFitError, e:
+                raise AutofocusError("Autofocus failed: %s" % e)
+            if not positions[0] <= best <= positions[-1]:
+                raise AutofocusError("Best focus %d outside the sampled range %d to %d." %
+                                     (best, positions[0], positions[-1]))
+            run["best"], run["fwhm"] = int(round(best)), fwhm
+
+            if move:
+                t0 = time.time()
+                focuser.moveTo(run["best"])
+                times["move"] += time.time() - t0
+            done = True
+        except Exception, e:
+            run["error"] = str(e)
+            self.log.error("Autofocus failed: %s" % e)
+            raise
+        finally:
+            if not done:
+                self._moveBack(focuser, start)
+            run["wall_time"] = time.time() - run["start"]
+            run["times"] = dict(times, overhead=run["wall_time"] - sum(times.values()))
+            self._runs.append(run)
+
+        self.log.info("Best focus %d, FWHM %.2f pixels, %d samples in %.1f s (exposure %.1f s, move %.1f s, "
+                      "analysis %.1f s)." % (run["best"], run["fwhm"], len(run["samples"]), run["wall_time"],
+                                             times["exposure"], times["move"], times["analysis"]))
+        return run["best"]
+
+    def _checkMove(self, focuser, position, status):
+        """
+        :return: None if the focuser move finished at ``position``, else the flag of the sample taken there.
+        """
+        if status is not None and str(status) != "OK":
+            return "focuser move %s" % status
+        actual = focuser.getPosition()
+        if actual != position:
+            return "focuser at %d" % actual
+        return None
+
+    def _flagSamples(self, samples):
+        """
+        Flags the samples the fit must skip: taken with the focuser away from their position, no star measured, or a
+        star away from where the other samples found it (another source, a cosmic ray on a faint frame).
+
+        :return: the samples left for the fit.
+        """
+        found = [s for s in samples if s["fwhm"] is not None and s["flag"] is None]
+        if found:
+            x = sorted(s["star_x"] for s in found)[len(found) // 2]
+            y = sorted(s["star_y"] for s in found)[len(found) // 2]
+        for sample in samples:
+            if sample["flag"] is not None:
+                pass
+            elif sample["fwhm"] is None:
+                sample["flag"] = "no star"
+            elif max(abs(sample["star_x"] - x), abs(sample["star_y"] - y)) > self["star_box"] // 2:
+                sample["flag"] = "star moved"
+            if sample["flag"] is not None:
+                self.log.warning("Focus %d: sample skipped, %s." % (sample["position"], sample["flag"]))
+        return [s for s in samples if s["flag"] is None]
+
+    def _findStar(self, camera, exptime):
+        """
+        Takes a full frame and returns the camera window of ``subframe`` pixels around its brightest star, so that
+        the focus frames are small.
+        """
+        frame = camera.takeFrame(exptime, None, self["binning"])
+        stats = frame_stats(frame, box=self["star_box"])
+        if stats["fwhm"] is None:
+            raise AutofocusError("No star found on the full frame to focus on.")
+        height, width = frame.shape
+        size = self["subframe"]
+        x1 = max(min(stats["star_x"] - size // 2, width - size), 0) + 1
+        y1 = max(min(stats["star_y"] - size // 2, height - size), 0) + 1
+        window = "%d:%d,%d:%d" % (x1, min(x1 + size - 1, width), y1, min(y1 + size - 1, height))
+        self.log.debug("Focusing on the star at %d, %d, window %s." % (stats["star_x"], stats["star_y"], window))
+        return window
+
+    def _moveBack(self, focuser, position):
+        # runs while the error of the run propagates, must not replace it
+        self.log.info("Moving the focuser back to %d." % position)
+        try:
+            focuser.moveTo(position)
+        except Exception, e:
+            self.log.exception("Could not move the focuser back to %d: %s" % (position, e))
+
+    def abort(self):
+        """
+        Aborts the running focus run after the current sample.
+        """
+        self._abort.set()
+
+    def getRuns(self, count=None):
+        """
+        Returns the last ``count`` runs, oldest first: their camera window, samples ({"position", "fwhm", "peak",
+        "background", "star_x", "star_y", "flag", "analysis_time"}, flag telling why the fit skipped the sample),
+        best position and FWHM, fit, error and the wall clock breakdown in seconds ("times": exposure, move not
+        overlapped with the analysis, analysis and overhead, "wall_time").
+        """
+        runs = list(self._runs)
+        return runs[-count:] if count else runs
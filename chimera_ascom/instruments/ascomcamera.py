@@ -2,50 +2,127 @@
 
 __author__ = 'william'
 
-import sys
+import os
+import copy
+import time
 import logging
+import threading
+import collections
 import datetime as dt
 
 import numpy as np
+
 from chimera.core.lock import lock
+from chimera.core.event import event
 from chimera.instruments.camera import CameraBase
 from chimera.core.exceptions import ChimeraException
 from chimera.interfaces.camera import CameraFeature, CCD, ReadoutMode, CameraStatus, Shutter
+from chimera.controllers.imageserver.imagerequest import ImageRequest
+from chimera.controllers.imageserver.image import Image
+from chimera.controllers.imageserver.util import ImageUtil, getImageServer
+
+from chimera_ascom.instruments.com import com
+from chimera_ascom.util.driver import DriverThread, TELEMETRY
+from chimera_ascom.util.fitswriter import write_fits
+from chimera_ascom.util.framestats import frame_stats, stats_headers
+from chimera_ascom.util.operation import Operation, OperationTimeout, poll
+from chimera_ascom.util.procwriter import ProcessWriter
+from chimera_ascom.util.profile import open_profile
+from chimera_ascom.util.readout import ImageReader, native_dtype, allocate_frame, binning_table, readout_speeds
+from chimera_ascom.util.snapshot import SetterCache
+from chimera_ascom.util.supervisor import ConnectionSupervisor, ConnectionFailed
+from chimera_ascom.util.telemetry import TelemetryPoller
+from chimera_ascom.util.transport import dispatch, DRIVER_ERRORS
+from chimera_ascom.util.video import FrameRing
+from chimera_ascom.util.workers import WorkerPool
 
 log = logging.getLogger(__name__)
 
-if sys.platform == "win32":
-    sys.coinit_flags = 0
-    from win32com.client import Dispatch
-    from pywintypes import com_error
-else:
-    log.warning("Not on Windows. ASCOM CAMERA will not work.")
+#: image request keys of this camera, unknown to ImageRequest.
+REQUEST_KEYS = ("readout_mode", "gain")
 
 
 class ASCOMCamera(CameraBase):
     __config__ = {"ascom_id": 'ASCOM.Simulator.Camera',
+                  "transport": "com",                   # com, alpaca or sim
+                  "alpaca_server": "localhost:11111",
+                  "alpaca_device": 0,
+                  "driver_timeout": 60,                 # seconds to wait for a driver call
+                  "slow_call": 0,           # seconds, driver calls slower than this are logged, 0 disables
+                  "metrics_file": None,     # driver call metrics file, rewritten every metrics_interval seconds
+                  "metrics_interval": 60,
+                  "profile_file": "~/.chimera/ascom_profiles.json",
+                  "alpaca_imagebytes": True,
                   "ascom_setup": False,
                   "max_connection_attempts": 3,
+                  "heartbeat": 10,          # seconds between driver link checks, 0 checks only after failed calls
+                  "reconnect_backoff": 60,  # maximum seconds between reconnection attempts
                   "ccd_width": None,
                   "ccd_height": None,
-                  "ignore_abort": False}
+                  "ignore_abort": False,
+                  "readout_mode": None,     # default readout mode name, None for the first one
+                  "fast_readout_mode": None,  # name of the fast readout mode, by default the one with "fast" in it
+                  "ready_margin": 0.5,      # seconds before the expected end of exposure to start polling ImageReady
+                  "ready_poll": 0.02,       # seconds between ImageReady polls
+                  "abort_latency": 0.1,     # maximum seconds to react to an abort
+                  "abort_timeout": 30,      # seconds abortExposure waits for an exposeSequence to stop
+                  "telemetry_cadence": 0,   # seconds between telemetry polls, 0 disables the poller
+                  "telemetry_size": 3600,
+                  "pipeline_depth": 2,      # frames waiting to be written during exposeSequence
+                  "frame_memmap": None,     # directory of scratch files frames are memory mapped on, None for RAM
+                  "fits_writer": False,     # write images on background workers, imageQueued fires once queued
+                  "fits_compression": None,  # None, rice, gzip or hcompress lossless tile compression (fits_writer)
+                  "fits_tile_rows": 16,     # rows of each compression tile
+                  "writer_workers": 2,      # fits_writer threads
+                  "writer_processes": 0,    # fits_writer processes doing the FITS writes, 0 writes on the threads
+                  "frame_stats": False,     # measure background, peak, saturation and FWHM of every frame
+                  "stats_box": 15,          # pixels of the box the FWHM is measured in
+                  "video_buffer": 8,        # frames kept by the video mode ring buffer
+                  "video_timeout": 10}      # seconds to wait for a video frame beyond its exposure time
 
     def __init__(self):
         CameraBase.__init__(self)
-        self._n_attempts = 0
+        self._driver = DriverThread(self.__class__.__name__)
+        self._cooling = None  # setpoint, restored on reconnection
+        self._has_percent_completed = True
+        self._exposure_stats = {}
+        self._sequence = threading.Event()
+        self._sequence_done = threading.Event()
+        self._sequence_done.set()
+        self._sequence_stats = {}
+        self._geometry = SetterCache(lambda: self._ascom)
+        self._readout_info = {}
+        self._frame_memory = {}
+        self._video = None
+        self._video_ring = None
+        self._frame_stats = collections.deque(maxlen=100)
+        self._video_stop = threading.Event()
 
     def __start__(self):
-
+        t0 = time.time()
+        self._driver.name = self["ascom_id"]
+        self._driver.timeout = self["driver_timeout"]
+        self._driver.metrics.slow_threshold = self["slow_call"]
+        if self["metrics_file"]:
+            self._driver.metrics.start_export(self["metrics_file"], self["metrics_interval"])
+
+        self._supervisor = ConnectionSupervisor(self["ascom_id"], self._driver, lambda: dispatch(self, "camera"),
+                                                restore=self._restore, interval=self["heartbeat"],
+                                                attempts=self["max_connection_attempts"],
+                                                max_backoff=self["reconnect_backoff"])
         self.open()
+        self._supervisor.start()
         self.log.debug("Ingore type" + str(type(self["ignore_abort"])) + str(self["ignore_abort"]))
 
+        self._profile = open_profile(self, self._ascom, "camera")
+
         # self.log.debug('supported actions: '+str(list(self._ascom.SupportedActions)))
         try:
-            self._ascom_min_exptime = self._ascom.ExposureMin
+            self._ascom_min_exptime = self._capability("ExposureMin")
         except AttributeError:
             self._ascom_min_exptime = 0
         try:
-            self._ascom_max_exptime = self._ascom.ExposureMax
+            self._ascom_max_exptime = self._capability("ExposureMax")
         except AttributeError:
             self._ascom_max_exptime = None
 
@@ -66,60 +143,148 @@ class ASCOMCamera(CameraBase):
 
         self._adcs = {"12 bits": self._MY_ADC}
 
-        self._binnings = {"1x1": 0,
-                          "2x2": 1,
-                          "3x3": 2,
-                          "9x9": 3}
-
-        self._binning_factors = {"1x1": 1,
-                                 "2x2": 2,
-                                 "3x3": 3,
-                                 "9x9": 9}
+        try:
+            self._gains = self._capability("Gains")
+        except (AttributeError,) + DRIVER_ERRORS:
+            self._gains = []
 
-        self._supports = {CameraFeature.TEMPERATURE_CONTROL: self._ascom.CanSetCCDTemperature,
-                          CameraFeature.PROGRAMMABLE_GAIN: False,
+        self._supports = {CameraFeature.TEMPERATURE_CONTROL: self._capability("CanSetCCDTemperature"),
+                          CameraFeature.PROGRAMMABLE_GAIN: len(self._gains) > 1,
                           CameraFeature.PROGRAMMABLE_OVERSCAN: False,
                           CameraFeature.PROGRAMMABLE_FAN: False,  # 'SetFanSpeed' in self._ascom_supported_actions,
                           CameraFeature.PROGRAMMABLE_LEDS: False,
                           CameraFeature.PROGRAMMABLE_BIAS_LEVEL: False}
 
         try:
-            self._ascom_readout_modes = list(self._ascom.ReadoutModes)
+            self._ascom_max_adu = self._capability("MaxADU")
         except AttributeError:
-            self._ascom_readout_modes = [0]
-        if len(self._ascom_readout_modes) != 1:  # if camera haves more than 1 readout mode, throw an exception
-            self.close()
-            raise NotImplementedError("Multiple ReadOut modes not implemented.")
-
-        self._pixelWidth = self._ascom.PixelSizeX
-        self._pixelHeight = self._ascom.PixelSizeY
-        self["ccd_width"] = self._ascom.CameraXSize
-        self["ccd_height"] = self._ascom.CameraYSize
-        self._readoutModes = {self._MY_CCD: {}}
-        i_mode_tot = 0
-        for i_mode in range(len(self._ascom_readout_modes)):
-            for binning, i_mode in self._binnings.iteritems():
-                readoutMode = ReadoutMode()
-                vbin, hbin = [int(v) for v in binning.split('x')]
-                readoutMode.mode = i_mode
-                readoutMode.gain = self._ascom.ElectronsPerADU
-                readoutMode.width = self["ccd_width"] / hbin
-                readoutMode.height = self["ccd_height"] / vbin
-                readoutMode.pixelWidth = self._pixelWidth * hbin
-                readoutMode.pixelHeight = self._pixelHeight * vbin
-                self._readoutModes[self._MY_CCD].update({i_mode: readoutMode})
-                i_mode_tot += 1
+            self._ascom_max_adu = None
+        self._image_reader = ImageReader(native_dtype(self._ascom_max_adu))
+
+        self._pixelWidth = self._capability("PixelSizeX")
+        self._pixelHeight = self._capability("PixelSizeY")
+        self["ccd_width"] = self._capability("CameraXSize")
+        self["ccd_height"] = self._capability("CameraYSize")
+        self._buildReadoutTables()
 
         try:
-            self["camera_model"] = "ASCOM: %s" % self._ascom.Description
-            self["ccd_model"] = "ASCOM: %s" % self._ascom.Description
+            self["camera_model"] = "ASCOM: %s" % self._capability("Description")
+            self["ccd_model"] = "ASCOM: %s" % self._capability("Description")
         except AttributeError:
             self["camera_model"] = "ASCOM camera %s" % self["ascom_id"]
 
+        self._telemetry = TelemetryPoller(self["ascom_id"], lambda: self._driver.proxy(TELEMETRY),
+                                          ("CCDTemperature", "CoolerOn", "CoolerPower", "CameraState"),
+                                          self["telemetry_cadence"], self["telemetry_size"])
+        self._telemetry.start()
+
+        # _saveImage is not thread safe, only the fits_writer uses more than one worker
+        self._writer = WorkerPool("%s writer" % self["ascom_id"],
+                                  workers=self["writer_workers"] if self["fits_writer"] else 1,
+                                  depth=self["pipeline_depth"])
+        self._process_writer = None
+        if self["fits_writer"] and self["writer_processes"] > 0:
+            frame_bytes = self["ccd_width"] * self["ccd_height"] * self._image_reader.dtype.itemsize
+            self._process_writer = ProcessWriter(self["ascom_id"], frame_bytes, slots=self["writer_workers"],
+                                                 processes=self["writer_processes"])
+        self._stats = WorkerPool("%s stats" % self["ascom_id"], workers=1,
+                                 depth=self["pipeline_depth"]) if self["frame_stats"] else None
+
         self.setHz(2)
 
+        self._startup_stats = {"startup_time": time.time() - t0,
+                               "profile": "warm" if self._profile.warm else "cold",
+                               "driver_reads": self._profile.driver_reads}
+        self.log.info("Started in %(startup_time).2f s, %(profile)s profile, %(driver_reads)d capability reads." %
+                      self._startup_stats)
+        if self._profile.warm:  # check the stored capabilities in background
+            Operation("%s profile check" % self["ascom_id"]).run(self._profile.verify, self._ascom)
+        else:
+            self._profile.save()
+
+    def _capability(self, member):
+        return self._profile.read(self._ascom, member)
+
+    def _optionalCapability(self, member, default):
+        try:
+            return self._capability(member)
+        except (AttributeError,) + DRIVER_ERRORS:
+            return default
+
+    def _buildReadoutTables(self):
+        """
+        Builds, once, the binnings (from MaxBinX, MaxBinY and CanAsymmetricBin) and the readout speeds (from
+        ReadoutModes or FastReadout) the camera supports.
+        """
+        self._binnings = {}
+        self._binning_axes = {}
+        self._binning_factors = {}
+        self._readoutModes = {self._MY_CCD: {}}
+        gain = self._capability("ElectronsPerADU")
+        table = binning_table(self._optionalCapability("MaxBinX", 1), self._optionalCapability("MaxBinY", 1),
+                              self._optionalCapability("CanAsymmetricBin", False))
+        for i_mode, (binning, bin_x, bin_y) in enumerate(table):
+            readoutMode = ReadoutMode()
+            readoutMode.mode = i_mode
+            readoutMode.gain = gain
+            readoutMode.width = self["ccd_width"] / bin_x
+            readoutMode.height = self["ccd_height"] / bin_y
+            readoutMode.pixelWidth = self._pixelWidth * bin_x
+            readoutMode.pixelHeight = self._pixelHeight * bin_y
+            self._readoutModes[self._MY_CCD][i_mode] = readoutMode
+            self._binnings[binning] = i_mode
+            self._binning_axes[binning] = (bin_x, bin_y)
+            self._binning_factors[binning] = bin_x
+
+        self._readout_speeds = readout_speeds(self._optionalCapability("ReadoutModes", None),
+                                              self._optionalCapability("CanFastReadout", False),
+                                              self["fast_readout_mode"])
+        self.log.debug("Binnings: %s. Readout modes: %s." % (", ".join(name for name, x, y in table),
+                                                             ", ".join(s["name"] for s in self._readout_speeds)))
+
+    def _readoutSpeed(self, request):
+        """
+        Returns the readout speed of the request ``readout_mode``: a mode name, "fast" or None for the default one.
+        """
+        name = request.get("readout_mode") or self["readout_mode"]
+        if name is None:
+            return self._readout_speeds[0]
+        for speed in self._readout_speeds:
+            if speed["name"] == name or (name == "fast" and speed["fast"]):
+                return speed
+        raise ChimeraException("Readout mode '%s' not available, use one of: %s." %
+                               (name, ", ".join(s["name"] for s in self._readout_speeds)))
+
+    def _gainSetting(self, request):
+        gain = request.get("gain")
+        if gain is None:
+            return {}
+        if gain in self._gains:
+            return {"Gain": self._gains.index(gain)}
+        if isinstance(gain, int) and 0 <= gain < len(self._gains):
+            return {"Gain": gain}
+        raise ChimeraException("Gain '%s' not available, use one of: %s." % (gain, ", ".join(self._gains)))
+
+    def getStartupStats(self):
+        """
+        Returns the startup time, whether the capability profile was warm or cold and the capability reads done.
+        """
+        return self._startup_stats
+
     def __stop__(self):
+        self._supervisor.stop()
+        self.stopVideo()
+        self._telemetry.stop()
+        self._writer.shutdown()
+        if self._process_writer is not None:
+            self._process_writer.close()
+        if self._stats is not None:
+            self._stats.shutdown()
         self.close()
+        self._driver.stop()
+        self._driver.metrics.stop_export()
+        if self["metrics_file"]:
+            self._driver.metrics.write(self["metrics_file"])
 
     def close(self):
         self._ascom.Connected = False
@@ -131,18 +296,26 @@ class ASCOMCamera(CameraBase):
         :return:
         '''
         self.log.debug('Starting ASCOM camera at %s' % self["ascom_id"])
-        self._ascom = Dispatch(self["ascom_id"])
         if self["ascom_setup"]:
-            self._ascom.SetupDialog()
+            self._driver.open(self._supervisor.factory).SetupDialog()
         try:
-            self._ascom.Connected = True
-        except com_error:
-            if self._n_attempts > self["max_connection_attempts"]:
-                raise ChimeraException("Could not configure camera after %d tries" % self._n_attempts)
-            self._n_attempts += 1
-            self._ascom.SetupDialog()
-            self.open()
+            self._supervisor.connect()
+        except ConnectionFailed, e:
+            raise ChimeraException(str(e))
+        self._ascom = self._driver.proxy()
+        self._geometry.invalidate()
 
+    def _restore(self):
+        """
+        Reapplies the camera settings after a reconnection.
+        """
+        self._geometry.invalidate()  # written again by the next exposure
+        if self._cooling is not None:
+            self._ascom.CoolerOn = True
+            self._ascom.SetCCDTemperature = self._cooling
+            self._telemetry.invalidate()
+
+    @com
     def _expose(self, request):
         """
         .. method:: expose(request=None, **kwargs)
@@ -153,6 +326,9 @@ class ASCOMCamera(CameraBase):
             :keyword request: ImageRequest object
             :type request: ImageRequest
         """
+        if self.isVideoRunning():
+            raise ChimeraException("Video mode is running, stop it before exposing.")
+
         self.exposeBegin(request)
 
         if self._ascom_max_exptime is not None:
@@ -172,36 +348,122 @@ class ASCOMCamera(CameraBase):
             request["exptime"] = self._ascom_min_exptime
             self.log.error("Exposure time less than the minimum %f, changing to the minimum." % request["exptime"])
 
-        mode, binning, top, left, width, height = self._getReadoutModeInfo(request["binning"], request["window"])
+        self._applyGeometry(request)
+
+        # Start Exposure...
+        try:
+            self._ascom.StartExposure(request["exptime"], light)
+        except DRIVER_ERRORS:
+            self._geometry.invalidate()  # the driver may have rejected the geometry
+            raise
+
+        status = self._waitExposure(request)
+
+        if self.abort.isSet() and self["ignore_abort"]:
+            self._readout(request)
+
+        self.exposeComplete(request, status)
+
+    def _applyGeometry(self, request):
+        """
+        Sets readout mode, gain, binning and subframe of the request on the driver, only the values that changed.
+        """
+        mode, binning, top, left, width, height = self._readoutModeInfo(request)
+        # Readout mode and gain, before the geometry as they may change it
+        settings = dict(self._readoutSpeed(request)["settings"], **self._gainSetting(request))
+        for member, value in sorted(settings.iteritems()):
+            self._geometry.set(member, value)
+
         # Binning
-        vbin, hbin = [int(v) for v in binning.split('x')]
-        self._ascom.BinX = vbin
-        self._ascom.BinY = hbin
+        bin_x, bin_y = self._binning_axes.get(binning, (1, 1))
+        self._geometry.set("BinX", bin_x)
+        self._geometry.set("BinY", bin_y)
 
         # Subframing
-        self._ascom.StartX = left
-        self._ascom.StartY = top
+        self._geometry.set("StartX", left)
+        self._geometry.set("StartY", top)
 
-        self._ascom.NumX = width
-        self._ascom.NumY = height
+        self._geometry.set("NumX", width)
+        self._geometry.set("NumY", height)
 
-        # Start Exposure...
-        self._ascom.StartExposure(request["exptime"], light)
+    def _waitExposure(self, request):
+        """
+        Waits for the image to be ready after StartExposure.
+
+        Sleeps, without touching the driver, until ``ready_margin`` seconds before the expected end of the exposure and
+        then polls ImageReady every ``ready_poll`` seconds. On long readouts PercentCompleted, when available, is used
+        to stretch the sleeps. Abort is checked at least every ``abort_latency`` seconds.
 
+        :return: CameraStatus of the exposure.
+        """
+        t0 = time.time()
+        cpu0 = sum(os.times()[:2])
+        end = t0 + request["exptime"]
+        calls = 0
         status = CameraStatus.OK
 
-        while 5 > self._ascom.CameraState > 0:
+        while True:
             # [ABORT POINT]
-            if self.abort.isSet():
-                if not self["ignore_abort"]:
-                    status = CameraStatus.ABORTED
-                    self._ascom.StopExposure()
-                    break
-
-        if self.abort.isSet() and self["ignore_abort"]:
-            self._readout(request)
-
-        self.exposeComplete(request, status)
+            if self.abort.isSet() and not self["ignore_abort"]:
+                status = CameraStatus.ABORTED
+                self._ascom.StopExposure()
+                calls += 1
+                break
+
+            remaining = end - time.time()
+            if remaining > self["ready_margin"]:
+                self._sleep(min(remaining - self["ready_margin"], self["abort_latency"]))
+                continue
+
+            calls += 1
+            if self._ascom.ImageReady:
+                break
+
+            calls += 1
+            state = self._ascom.CameraState
+            if state == 5:  # cameraError
+                status = CameraStatus.ERROR
+                break
+            elif state == 0:  # cameraIdle without an image: exposure was stopped outside of chimera.
+                break
+
+            wait = self["ready_poll"]
+            if -remaining > self["ready_margin"] and self._has_percent_completed:
+                try:
+                    calls += 1
+                    percent = self._ascom.PercentCompleted
+                except Exception:
+                    self._has_percent_completed = False
+                else:
+                    if 0 < percent < 100:
+                        elapsed = time.time() - t0
+                        wait = max(wait, 0.5 * elapsed * (100. - percent) / percent)
+            self._sleep(min(wait, self["abort_latency"]))
+
+        self._exposure_stats = {"exptime": request["exptime"],
+                                "wait_time": time.time() - t0,
+                                "process_cpu_time": sum(os.times()[:2]) - cpu0,
+                                "com_calls": calls}
+        self.log.debug("Exposure wait: %(wait_time).3f s, %(process_cpu_time).3f s process CPU, %(com_calls)d COM "
+                       "calls" % self._exposure_stats)
+        return status
+
+    def _sleep(self, seconds):
+        # wakes up on abort, unless aborts are ignored (the event would be already set)
+        if self["ignore_abort"]:
+            time.sleep(seconds)
+        else:
+            self.abort.wait(seconds)
+
+    def getExposureStats(self):
+        """
+        Returns wait time, process CPU time and number of COM calls spent waiting for the last exposure, and the
+        geometry writes done and skipped since the camera connected. The CPU time is that of the whole manager
+        process during the wait (driver thread, other instruments included): the driver calls don't run on the
+        waiting thread, its own CPU time would miss them. It is only meaningful on an otherwise idle manager.
+        """
+        return dict(self._exposure_stats, geometry_writes=self._geometry.writes,
+                    geometry_skipped=self._geometry.skipped)
 
     def _readout(self, request):
         self.readoutBegin(request)
@@ -212,21 +474,390 @@ class ASCOMCamera(CameraBase):
                 self.readoutComplete(None, CameraStatus.ABORTED)
                 return None
 
-        pix = np.transpose(np.array(self._ascom.ImageArray))
+        pix, extras = self._transfer(request)
+        if self["fits_writer"]:  # the caller gets the image once written, only exposeSequence goes on meanwhile
+            return self._queueImage(request, pix, extras).wait()
+        return self._store(request, pix, extras, wait_stats=False)
 
-        (mode, binning, top, left, width, height) = self._getReadoutModeInfo(request["binning"], request["window"])
+    def _readoutModeInfo(self, request):
+        """
+        _getReadoutModeInfo of the request, computed once per binning and window.
+        """
+        key = (request["binning"], str(request["window"]))
+        if key not in self._readout_info:
+            self._readout_info[key] = self._getReadoutModeInfo(request["binning"], request["window"])
+        return self._readout_info[key]
+
+    def _transfer(self, request):
+        """
+        Pulls the image and its exposure metadata from the driver. Must be done before the next exposure starts.
+        """
+        (mode, binning, top, left, width, height) = self._readoutModeInfo(request)
+
+        t0 = time.time()
+        frame = allocate_frame((height, width), self._image_reader.dtype, self["frame_memmap"])
+        pix = self._image_reader.read(self._ascom, shape=(width, height), out=frame)
+        self.log.debug("Read %dx%d %s image in %.3f s (%s path)" % (pix.shape[1], pix.shape[0], pix.dtype,
+                                                                   time.time() - t0, self._image_reader.last_path))
+        self._frame_memory = {"dtype": pix.dtype.name, "bytes": pix.nbytes,
+                              "heap_bytes": 0 if isinstance(pix, np.memmap) else pix.nbytes,
+                              "memmap": isinstance(pix, np.memmap),
+                              "frames_in_flight": self._writer.pending() + 1}
+        self.log.debug("Frame memory: %(bytes)d bytes %(dtype)s, %(heap_bytes)d on the heap, "
+                       "%(frames_in_flight)d frames in flight." % self._frame_memory)
+
+        extras = {"frame_start_time": dt.datetime.strptime(self._ascom.LastExposureStartTime, "%Y-%m-%dT%H:%M:%S"),
+                  "frame_temperature": self.getTemperature(),
+                  "binning_factor": self._binning_factors[binning]}
+        if self._stats is not None:  # measured while the next exposure starts, waited for when saving
+            extras["stats"] = self._stats.submit(self._measure, pix)
+        return pix, extras
+
+    def _measure(self, pix):
+        t0 = time.time()
+        stats = frame_stats(pix, self._ascom_max_adu, self["stats_box"])
+        stats["time"] = t0
+        stats["cost"] = time.time() - t0
+        self._frame_stats.append(stats)
+        return stats
+
+    def _statsHeaders(self, job, wait=True):
+        """
+        :param wait: wait for the measurement, else the headers are only returned if it is already done.
+        """
+        if job is None:
+            return []
+        if not wait and not job.done():
+            self.log.debug("Frame statistics not measured yet, saving the image without them.")
+            return []
+        try:
+            return stats_headers(job.wait())
+        except Exception, e:
+            self.log.error("Could not measure the frame statistics: %s" % e)
+            return []
+
+    def getFrameStats(self, count=1):
+        """
+        Returns the statistics of the last ``count`` frames, oldest first, with frame_stats enabled: background,
+        noise, peak (and its peak_x, peak_y position), saturated pixels, fwhm (of the star at star_x, star_y),
+        measurement time and cost in seconds.
+        """
+        return list(self._frame_stats)[-count:]
+
+    def _store(self, request, pix, extras, wait_stats=True):
+        """
+        Adds the camera headers, saves the image and fires readoutComplete.
+
+        :param wait_stats: wait for the frame statistics headers. expose doesn't: it saves on the exposing thread, the
+            statistics then only reach the headers if measured in time, and getFrameStats in any case.
+        """
+        (mode, binning, top, left, width, height) = self._readoutModeInfo(request)
 
         request.headers.append(('GAIN', str(mode.gain), 'Electronic gain in photoelectrons per ADU'))
+        request.headers.append(('READMODE', self._readoutSpeed(request)["name"], 'Camera readout mode'))
+        request.headers += self._statsHeaders(extras.pop("stats", None), wait_stats)
 
-        proxy = self._saveImage(request, pix, {
-            "frame_start_time": dt.datetime.strptime(self._ascom.LastExposureStartTime, "%Y-%m-%dT%H:%M:%S"),
-            "frame_temperature": self.getTemperature(),
-            "binning_factor": self._binning_factors[binning]})
+        proxy = self._saveImage(request, pix, extras)
 
+        self.readoutComplete(proxy, CameraStatus.OK)
+        return proxy
 
+    def _queueImage(self, request, pix, extras):
+        """
+        fits_writer version of _store: collects the headers, queues the image for the writer workers and fires
+        imageQueued with the file name, without waiting for the disk. readoutComplete fires with the image proxy once
+        the file is written and registered.
+
+        :return: Operation finished with the image proxy.
+        """
+        (mode, binning, top, left, width, height) = self._readoutModeInfo(request)
+        stats = extras.pop("stats", None)
+
+        request.headers.append(('GAIN', str(mode.gain), 'Electronic gain in photoelectrons per ADU'))
+        request.headers.append(('READMODE', self._readoutSpeed(request)["name"], 'Camera readout mode'))
+        # like CameraBase._saveImage, getMetadata takes DATE-OBS and CCD-TEMP from extra_header_info, read now: the
+        # next frame changes it
+        self.extra_header_info = extras
+        cards = list(request.headers) + list(self.getMetadata(request))
+
+        path = ImageUtil.makeFilename(request["filename"])
+        job = self._writer.submit(self._writeImage, path, pix, cards, stats)
+        job.path = path
+
+        self.imageQueued(path)
+        return job
+
+    def _writeImage(self, path, pix, cards, stats=None):
+        cards += self._statsHeaders(stats)
+        t0 = time.time()
+        write = self._process_writer.write if self._process_writer is not None else write_fits
+        try:
+            write(path, pix, cards, self["fits_compression"], self["fits_tile_rows"])
+            proxy = getImageServer(self.getManager()).register(Image.fromFile(path))
+        except Exception:
+            self.readoutComplete(None, CameraStatus.ERROR)
+            raise
+        self.log.debug("Wrote %s in %.3f s" % (path, time.time() - t0))
         self.readoutComplete(proxy, CameraStatus.OK)
         return proxy
 
+    @event
+    def imageQueued(self, path):
+        """
+        Fired with fits_writer when an image is read out and queued for writing, ``path`` being its file name.
+        """
+
+    def expose(self, request=None, **kwargs):
+        """
+        CameraBase.expose, also taking the ``readout_mode`` and ``gain`` keys of this camera.
+        """
+        return CameraBase.expose(self, self._imageRequest(request, kwargs))
+
+    def _imageRequest(self, request, kwargs):
+        """
+        Builds the ImageRequest of ``request`` (an ImageRequest, a dict or None for ``kwargs``). ImageRequest rejects
+        the keys it doesn't know, REQUEST_KEYS are set after it is built.
+        """
+        if isinstance(request, ImageRequest):
+            return request
+        options = dict(request or kwargs)
+        extras = dict((key, options.pop(key)) for key in REQUEST_KEYS if key in options)
+        request = ImageRequest(**options)
+        request.update(extras)
+        return request
+
+    @lock
+    def exposeSequence(self, request=None, **kwargs):
+        """
+        Takes ``frames`` frames like expose, but pipelined: each exposure starts as soon as the previous image has been
+        transferred from the driver, while the headers and FITS file of the previous frames are written on a worker.
+        At most ``pipeline_depth`` transferred frames wait for the worker, further frames wait for room.
+
+        On abort the exposure in progress is stopped and not read out, frames already transferred are still saved.
+
+        :return: tuple of image proxies.
+        """
+        request = self._imageRequest(request, kwargs)
+
+        self.abort.clear()
+        self._sequence_done.clear()
+        self._sequence.set()
+        self._writer.max_pending = 0
+        jobs = []
+        t0 = time.time()
+        try:
+            for frame in range(request["frames"]):
+                # [ABORT POINT]
+                if self.abort.isSet():
+                    break
+
+                request.beginExposure(self)
+                self._expose(request)
+
+                # [ABORT POINT]
+                if self.abort.isSet():
+                    break
+
+                self.readoutBegin(request)
+                pix, extras = self._transfer(request)
+                request.endExposure()
+
+                # the next frame reuses the request, the writer gets a copy with the headers of this frame
+                frame_request = copy.copy(request)
+                frame_request.headers = list(request.headers)
+                if self["fits_writer"]:
+                    jobs.append(self._queueImage(frame_request, pix, extras))
+                else:
+                    jobs.append(self._writer.submit(self._store, frame_request, pix, extras))
+
+                if request["interval"] > 0 and frame < request["frames"] - 1:
+                    self._sleep(request["interval"])
+
+            acquisition = time.time() - t0
+            images = tuple(job.wait() for job in jobs)
+        finally:
+            self._sequence.clear()
+            self._sequence_done.set()
+
+        exposure = len(jobs) * request["exptime"]
+        self._sequence_stats = {"frames": len(images),
+                                "exposure_time": exposure,
+                                "acquisition_time": acquisition,
+                                "wall_time": time.time() - t0,
+                                "duty_cycle": exposure / acquisition if acquisition else 0.,
+                                "max_pending": self._writer.max_pending}
+        self.log.info("Sequence of %(frames)d frames: %(wall_time).1f s, duty cycle %(duty_cycle).2f" %
+                      self._sequence_stats)
+        return images
+
+    @lock
+    def startVideo(self, exptime=0.01, window=None, binning=None, readout_mode=None):
+        """
+        Starts the video mode: short exposures of a fixed window taken in a loop, without headers or files. Each frame
+        is read into a ring buffer of ``video_buffer`` preallocated arrays; use getLatestFrame, subscribeVideo and
+        saveVideoFrame to get them, stopVideo to stop. expose is refused while the video runs.
+
+        :param readout_mode: readout mode name or "fast", default: readout_mode option.
+        """
+        if self.isVideoRunning():
+            raise ChimeraException("Video mode is already running.")
+        if self.isExposing():
+            raise ChimeraException("Camera is exposing.")
+
+        request = self._frameRequest(exptime, window, binning, readout_mode)
+        mode, binning, top, left, width, height = self._readoutModeInfo(request)
+        self._applyGeometry(request)
+
+        self._video_ring = FrameRing((height, width), self._image_reader.dtype, self["video_buffer"])
+        self._video_request = request
+        self._video_stop.clear()
+        self._video = Operation("%s video" % self["ascom_id"]).run(self._videoLoop, request, width, height)
+        self.log.info("Video mode started: %dx%d frames of %.3f s." % (width, height, request["exptime"]))
+        return True
+
+    def _frameRequest(self, exptime, window, binning, readout_mode):
+        options = dict(exptime=exptime, window=window, binning=binning, readout_mode=readout_mode)
+        return self._imageRequest(None, dict((key, value) for key, value in options.iteritems() if value is not None))
+
+    @lock
+    @com
+    def takeFrame(self, exptime, window=None, binning=None, readout_mode=None):
+        """
+        Takes a light frame and returns it as an array, without headers, files or events. For focus and pointing
+        loops that only measure the image.
+        """
+        if self.isVideoRunning():
+            raise ChimeraException("Video mode is running, stop it before exposing.")
+
+        request = self._frameRequest(exptime, window, binning, readout_mode)
+        mode, binning, top, left, width, height = self._readoutModeInfo(request)
+        self._applyGeometry(request)
+
+        self.abort.clear()
+        self._ascom.StartExposure(request["exptime"], True)
+        status = self._waitExposure(request)
+        if status != CameraStatus.OK:
+            raise ChimeraException("Frame not taken: %s." % status)
+        return self._image_reader.read(self._ascom, shape=(width, height))
+
+    def _videoLoop(self, request, width, height):
+        ring = self._video_ring
+        t0 = time.time()
+        try:
+            while not self._video_stop.isSet():
+                self._ascom.StartExposure(request["exptime"], True)
+                timeout = request["exptime"] + self["video_timeout"]
+                try:
+                    ready = poll(lambda: self._ascom.ImageReady, timeout, abort=self._video_stop,
+                                 expected=request["exptime"], min_interval=self["ready_poll"],
+                                 max_interval=self["abort_latency"])
+                except OperationTimeout:
+                    raise ChimeraException("No video frame after %.1f s." % timeout)
+                if not ready:
+                    self._ascom.StopExposure()
+                    break
+                self._image_reader.read(self._ascom, shape=(width, height), out=ring.slot())
+                ring.commit()
+        finally:
+            elapsed = time.time() - t0
+            self.log.info("Video mode stopped: %d frames in %.1f s, %.1f fps." %
+                          (ring.count, elapsed, ring.count / elapsed if elapsed else 0.))
+        return ring.count
+
+    def stopVideo(self):
+        """
+        Stops the video mode, the last frames stay available.
+
+        :return: number of frames taken.
+        """
+        if self._video is None:
+            return 0
+        self._video_stop.set()
+        try:
+            return self._video.wait(self["video_timeout"])
+        except Exception, e:
+            self.log.error("Video mode ended with error: %s" % e)
+            return self._video_ring.count
+        finally:
+            self._video = None
+
+    def isVideoRunning(self):
+        return self._video is not None and not self._video.done()
+
+    def getLatestFrame(self):
+        """
+        :return: (number, timestamp, frame array) of the newest video frame, (None, None, None) if there is none.
+        """
+        if self._video_ring is None:
+            return None, None, None
+        return self._video_ring.latest()
+
+    def subscribeVideo(self, callback):
+        """
+        Calls ``callback(number, timestamp, frame)`` for every video frame, on the acquisition thread. ``frame`` is
+        a view of the ring buffer, overwritten ``video_buffer`` frames later. Only for objects living in the same
+        process, remote clients should poll getLatestFrame.
+        """
+        if self._video_ring is None:
+            raise ChimeraException("Video mode was not started.")
+        self._video_ring.subscribe(callback)
+
+    def unsubscribeVideo(self, callback):
+        if self._video_ring is not None:
+            self._video_ring.unsubscribe(callback)
+
+    def saveVideoFrame(self, filename="$DATE-$TIME"):
+        """
+        Writes the newest video frame to a FITS file.
+
+        :return: the file name, None if there is no frame.
+        """
+        number, timestamp, frame = self.getLatestFrame()
+        if frame is None:
+            return None
+        cards = [("EXPTIME", self._video_request["exptime"], "exposure time in seconds"),
+                 ("DATE-OBS", dt.datetime.utcfromtimestamp(timestamp).isoformat(), "frame read time (UTC)"),
+                 ("VIDFRAME", number, "video frame number"),
+                 ("READMODE", self._readoutSpeed(self._video_request)["name"], "Camera readout mode")]
+        return write_fits(ImageUtil.makeFilename(filename), frame, cards)
+
+    def getVideoStats(self):
+        """
+        Returns whether the video runs, the frames taken, the frame rate over the ring buffer, the frame size and
+        the exposure time.
+        """
+        if self._video_ring is None:
+            return {"running": False, "frames": 0, "fps": 0.}
+        height, width = self._video_ring.shape
+        return {"running": self.isVideoRunning(), "frames": self._video_ring.count, "fps": self._video_ring.fps(),
+                "width": width, "height": height, "exptime": self._video_request["exptime"]}
+
+    def getFrameMemory(self):
+        """
+        Returns the memory of the last frame: dtype, bytes, bytes on the process heap (0 if memory mapped), whether
+        it is memory mapped and the frames held by the camera at that time (transferred, waiting to be written).
+        """
+        return self._frame_memory
+
+    def getSequenceStats(self):
+        """
+        Returns frames, exposure and wall times and the duty cycle (exposure time / acquisition time) of the last
+        exposeSequence.
+        """
+        return self._sequence_stats
+
+    def isExposing(self):
+        return self._sequence.isSet() or CameraBase.isExposing(self)
+
+    def abortExposure(self, readout=True):
+        if not self._sequence.isSet():
+            return CameraBase.abortExposure(self, readout)
+        self.abort.set()
+        if not self._sequence_done.wait(self["abort_timeout"]):
+            self.log.error("Sequence still running %d s after the abort." % self["abort_timeout"])
+            return False
+        return True
+
     @lock
     def startFan(self, rate=None):
         if not self.supports(CameraFeature.PROGRAMMABLE_FAN):
@@ -270,34 +901,86 @@ class ASCOMCamera(CameraBase):
     def getReadoutModes(self):
         return self._readoutModes
 
+    def getReadoutSpeeds(self):
+        """
+        Returns the camera readout modes (ASCOM ReadoutModes or FastReadout) as a list of {"name", "fast"}. Choose one
+        with the ``readout_mode`` key of the image request: a name, or "fast" for the fast one.
+        """
+        return [{"name": speed["name"], "fast": speed["fast"]} for speed in self._readout_speeds]
+
+    def getGains(self):
+        """
+        Returns the names of the camera gains (ASCOM Gains), chosen with the ``gain`` key of the image request.
+        """
+        return list(self._gains)
+
     def supports(self, feature=None):
         return self._supports[feature]
 
     @lock
+    @com
     def startCooling(self, setpoint):
         if not self.supports(CameraFeature.TEMPERATURE_CONTROL):
             return False
         self._ascom.CoolerOn = True
         self._ascom.SetCCDTemperature = setpoint
+        self._telemetry.invalidate()
+        self._cooling = setpoint
         return True
 
     @lock
+    @com
     def stopCooling(self):
         if not self.supports(CameraFeature.TEMPERATURE_CONTROL):
             return False
         self._ascom.CoolerOn = False
+        self._telemetry.invalidate()
+        self._cooling = None
 
+    @com
     def isCooling(self):
         if not self.supports(CameraFeature.TEMPERATURE_CONTROL):
             return False
-        return self._ascom.CoolerOn
+        return bool(self._telemetry.value("CoolerOn", lambda: self._ascom.CoolerOn))
 
     @lock
+    @com
     def getTemperature(self):
         if not self.supports(CameraFeature.TEMPERATURE_CONTROL):
             return False
-        return self._ascom.CCDTemperature
+        return self._telemetry.value("CCDTemperature", lambda: self._ascom.CCDTemperature)
+
+    def getTelemetry(self, since=None):
+        """
+        Returns the telemetry samples newer than ``since`` (unix time) as {"time": [...], property: [...]}.
+        """
+        return self._telemetry.since(since)
+
+    def getDriverStats(self):
+        """
+        Returns the driver thread queue depth and the wait times per request priority.
+        """
+        return self._driver.stats()
+
+    def getConnectionStats(self):
+        """
+        Returns whether the driver is connected, the reconnections done, the total downtime and the last error.
+        """
+        return self._supervisor.stats()
+
+    def getMetrics(self):
+        """
+        Returns call counts, error counts and latency histograms of the driver calls, per ASCOM member.
+        """
+        return self._driver.metrics.stats()
+
+    def writeMetrics(self, path=None):
+        """
+        Writes the driver call metrics, in the Prometheus text format, to ``path`` (default: metrics_file).
+        """
+        self._driver.metrics.write(path or self["metrics_file"])
 
+    @com
     def getSetPoint(self):
         return self._ascom.SetCCDTemperature
 
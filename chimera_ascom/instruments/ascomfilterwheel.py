@@ -1,36 +1,112 @@
+import time
 import logging
-import sys
+import itertools
+import collections
 
-import time
 from chimera.core.exceptions import ChimeraException
 from chimera.interfaces.filterwheel import InvalidFilterPositionException
 from chimera.instruments.filterwheel import FilterWheelBase
 from chimera.core.lock import lock
 
+from chimera_ascom.instruments.com import com
+from chimera_ascom.util.driver import DriverThread, TELEMETRY
+from chimera_ascom.util.operation import Operation, OperationTimeout, poll
+from chimera_ascom.util.profile import open_profile
+from chimera_ascom.util.supervisor import ConnectionSupervisor, ConnectionFailed
+from chimera_ascom.util.telemetry import TelemetryPoller
+from chimera_ascom.util.transport import dispatch
+
 log = logging.getLogger(__name__)
 
-if sys.platform == "win32":
-    sys.coinit_flags = 0
-    from win32com.client import Dispatch
-    from pywintypes import com_error
-else:
-    log.warning("Not on Windows. ASCOM Filter Wheel will not work.")
+#: filter changes whose result can still be asked for by number.
+CHANGES_KEPT = 20
+
+
+class FilterChangeHandle(object):
+    """
+    Handle of a filter change started with ``wait=False``. It only holds a proxy to the filter wheel and the change
+    number, so it works through Pyro too.
+    """
+
+    def __init__(self, wheel, number):
+        self.wheel = wheel
+        self.number = number
+
+    def wait(self, timeout=None):
+        """
+        :return: True if the wheel reached the filter, False on change timeout, None if it is still moving after
+            ``timeout`` seconds.
+        """
+        return self.wheel.waitFilter(timeout, self.number)
+
+    def done(self):
+        return self.wheel.waitFilter(0, self.number) is not None
 
 
 class ASCOMFilterWheel(FilterWheelBase):
     __config__ = {"ascom_id": "ASCOM.Simulator.FilterWheel",
+                  "transport": "com",                   # com, alpaca or sim
+                  "alpaca_server": "localhost:11111",
+                  "alpaca_device": 0,
+                  "driver_timeout": 60,                 # seconds to wait for a driver call
+                  "slow_call": 0,           # seconds, driver calls slower than this are logged, 0 disables
+                  "metrics_file": None,     # driver call metrics file, rewritten every metrics_interval seconds
+                  "metrics_interval": 60,
+                  "profile_file": "~/.chimera/ascom_profiles.json",
                   "ascom_setup": False,
                   "max_connection_attempts": 3,
-                  "change_timeout": 60}     # seconds
+                  "heartbeat": 10,          # seconds between driver link checks, 0 checks only after failed calls
+                  "reconnect_backoff": 60,  # maximum seconds between reconnection attempts
+                  "change_timeout": 60,     # seconds
+                  "telemetry_cadence": 0,   # seconds between telemetry polls, 0 disables the poller
+                  "telemetry_size": 3600}
 
     def __init__(self):
         FilterWheelBase.__init__(self)
 
-        self._n_attempts = 0
+        self._driver = DriverThread(self.__class__.__name__)
+        self._change = None
+        self._change_number = 0
+        self._change_numbers = itertools.count(1)
+        self._changes = collections.OrderedDict()  # number: Operation of the last changes
+        self._change_times = {}  # (from filter, to filter): seconds of the last change between them
+        self._filter = None  # last filter the wheel was seen at
 
     def __start__(self):
+        t0 = time.time()
+        self._driver.name = self["ascom_id"]
+        self._driver.timeout = self["driver_timeout"]
+        self._driver.metrics.slow_threshold = self["slow_call"]
+        if self["metrics_file"]:
+            self._driver.metrics.start_export(self["metrics_file"], self["metrics_interval"])
 
+        self._supervisor = ConnectionSupervisor(self["ascom_id"], self._driver, lambda: dispatch(self, "filterwheel"),
+                                                interval=self["heartbeat"], attempts=self["max_connection_attempts"],
+                                                max_backoff=self["reconnect_backoff"])
         self.open()
+        self._supervisor.start()
+
+        self._telemetry = TelemetryPoller(self["ascom_id"], lambda: self._driver.proxy(TELEMETRY), ("Position",),
+                                          self["telemetry_cadence"], self["telemetry_size"])
+        self._telemetry.start()
+
+        self._startup_stats = {"startup_time": time.time() - t0,
+                               "profile": "warm" if self._profile.warm else "cold",
+                               "driver_reads": self._profile.driver_reads}
+        self.log.info("Started in %(startup_time).2f s, %(profile)s profile, %(driver_reads)d capability reads." %
+                      self._startup_stats)
+        if self._profile.warm:  # check the stored capabilities in background
+            Operation("%s profile check" % self["ascom_id"]).run(self._profile.verify, self._ascom)
+        else:
+            self._profile.save()
+
+    def __stop__(self):
+        self._supervisor.stop()
+        self._telemetry.stop()
+        self._driver.stop()
+        self._driver.metrics.stop_export()
+        if self["metrics_file"]:
+            self._driver.metrics.write(self["metrics_file"])
 
     def open(self):
         '''
@@ -38,38 +114,156 @@ class ASCOMFilterWheel(FilterWheelBase):
         :return:
         '''
         self.log.debug('Starting ASCOM filter wheel at %s' % self["ascom_id"])
-        self._ascom = Dispatch(self["ascom_id"])
         if self["ascom_setup"]:
-            self._ascom.SetupDialog()
+            self._driver.open(self._supervisor.factory).SetupDialog()
         try:
-            self._ascom.Connected = True
-        except com_error:
-            if self._n_attempts > self["max_connection_attempts"]:
-                raise ChimeraException("Could not configure filterwheel after %d tries" % self._n_attempts)
-            self._n_attempts += 1
-            self._ascom.SetupDialog()
-            self.open()
+            self._supervisor.connect()
+        except ConnectionFailed, e:
+            raise ChimeraException(str(e))
+        self._ascom = self._driver.proxy()
+        self._profile = open_profile(self, self._ascom, "filterwheel")
         try:
-            self["filter_wheel_model"] = "ASCOM: %s" % self._ascom.Description
+            self["filter_wheel_model"] = "ASCOM: %s" % self._profile.read(self._ascom, "Description")
         except AttributeError:
             self["filter_wheel_model"] = "ASCOM filter wheel %s" % self["ascom_id"]
 
+    @com
     def getFilter(self):
-        return self._getFilterName(self._ascom.Position)
+        """
+        Returns the current filter name. While the wheel is moving, returns the filter it was last seen at.
+
+        :raises ChimeraException: if the wheel is moving and was never seen at a filter.
+        """
+        position = int(self._telemetry.value("Position", lambda: self._ascom.Position))
+        if position != -1:
+            self._filter = self._getFilterName(position)
+        elif self._filter is None:
+            raise ChimeraException("Filter wheel is moving, its filter is not known yet.")
+        return self._filter
 
     @lock
-    def setFilter(self, filter):
+    @com
+    def setFilter(self, filter, wait=True):
+        """
+        Changes to ``filter``. With ``wait=False`` returns a FilterChangeHandle as soon as the wheel starts moving.
+
+        :return: True if the wheel reached the filter, False on timeout.
+        """
         filterName = str(filter).upper()
 
         if filterName not in self.getFilters():
             raise InvalidFilterPositionException("Invalid filter %s." % filter)
+        if self.isMoving():
+            raise ChimeraException("Filter wheel is already moving.")
 
-        self.filterChange(filter, self.getFilter())
+        source = self.getFilter()
+        self.filterChange(filter, source)
 
-        self._ascom.Position = self._getFilterPosition(filter)
+        position = self._getFilterPosition(filter)
+        self._ascom.Position = position
+        self._telemetry.invalidate()
 
-        t0 = time.time()
-        while time.time() - t0 < self["change_timeout"]:
-            if self.getFilter() == filterName:
-                return True
-        return False
+        number = self._change_number = next(self._change_numbers)
+        self._change = self._changes[number] = Operation("Filter change to %s" % filterName)
+        while len(self._changes) > CHANGES_KEPT:
+            self._changes.popitem(last=False)
+        if not wait:
+            self._change.run(self._waitFilter, source, filterName, position)
+            return FilterChangeHandle(self.getProxy(), number)
+        try:
+            self._change.finish(self._waitFilter(source, filterName, position))
+        except Exception, e:
+            self._change.finish(error=e)
+            raise
+        return self._change.result
+
+    def _waitFilter(self, source, filterName, position):
+        # the driver reports -1 while moving, the wheel is ready when it reports the target index
+        change = self._change
+        try:
+            poll(lambda: self._ascom.Position == position, self["change_timeout"],
+                 expected=self._change_times.get((source, filterName)))
+        except OperationTimeout:
+            self.log.error("Filter wheel didn't reach %s after %d s." % (filterName, self["change_timeout"]))
+            return False
+        self._filter = filterName
+        self._change_times[(source, filterName)] = change.elapsed
+        self.log.debug("Filter change from %s to %s took %.2f s." % (source, filterName, change.elapsed))
+        return True
+
+    def isMoving(self):
+        return self._change is not None and not self._change.done()
+
+    def waitFilter(self, timeout=None, number=None):
+        """
+        Waits for the current filter change (or change ``number``).
+
+        :return: True if the wheel reached the filter, False on change timeout, None if it is still moving after
+            ``timeout`` seconds.
+        """
+        if number is None:
+            change = self._change
+        elif number in self._changes:
+            change = self._changes[number]
+        else:
+            raise ChimeraException("Unknown filter change %d, only the last %d are kept." % (number, CHANGES_KEPT))
+        if change is None:
+            return True
+        try:
+            return change.wait(timeout)
+        except OperationTimeout:
+            return None
+
+    @com
+    def getFocusOffsets(self):
+        """
+        Returns the focuser offset of each filter (ASCOM FocusOffsets), {} if the driver doesn't have them.
+        """
+        try:
+            offsets = self._profile.read(self._ascom, "FocusOffsets")
+        except AttributeError:
+            return {}
+        filters = self.getFilters()
+        return dict((filters[i], int(offset)) for i, offset in enumerate(offsets) if i < len(filters))
+
+    def getFilterChangeTimes(self):
+        """
+        Returns the duration in seconds of the last change between each pair of filters, keyed by (from, to).
+        """
+        return self._change_times
+
+    def getTelemetry(self, since=None):
+        """
+        Returns the telemetry samples newer than ``since`` (unix time) as {"time": [...], property: [...]}.
+        """
+        return self._telemetry.since(since)
+
+    def getDriverStats(self):
+        """
+        Returns the driver thread queue depth and the wait times per request priority.
+        """
+        return self._driver.stats()
+
+    def getConnectionStats(self):
+        """
+        Returns whether the driver is connected, the reconnections done, the total downtime and the last error.
+        """
+        return self._supervisor.stats()
+
+    def getMetrics(self):
+        """
+        Returns call counts, error counts and latency histograms of the driver calls, per ASCOM member.
+        """
+        return self._driver.metrics.stats()
+
+    def writeMetrics(self, path=None):
+        """
+        Writes the driver call metrics, in the Prometheus text format, to ``path`` (default: metrics_file).
+        """
+        self._driver.metrics.write(path or self["metrics_file"])
+
+    def getStartupStats(self):
+        """
+        Returns the startup time, whether the capability profile was warm or cold and the capability reads done.
+        """
+        return self._startup_stats
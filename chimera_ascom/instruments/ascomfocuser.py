@@ -1,34 +1,107 @@
 # Based on http://www.ascom-standards.org/Help/Developer/html/AllMembers_T_ASCOM_DriverAccess_Focuser.htm
+import time
 import logging
-import sys
+import threading
+import itertools
+import collections
 
 from chimera.core.lock import lock
+from chimera.core.event import event
+from chimera.core.exceptions import ChimeraException
+from chimera.util.enum import Enum
 from chimera.interfaces.focuser import FocuserFeature, InvalidFocusPositionException, FocuserAxis
 from chimera.instruments.focuser import FocuserBase
 
+from chimera_ascom.instruments.com import com
+from chimera_ascom.util.driver import DriverThread, TELEMETRY
+from chimera_ascom.util.operation import Operation, OperationTimeout, poll
+from chimera_ascom.util.profile import open_profile
+from chimera_ascom.util.supervisor import ConnectionSupervisor, ConnectionFailed
+from chimera_ascom.util.telemetry import TelemetryPoller
+from chimera_ascom.util.transport import dispatch, DRIVER_ERRORS
+
 log = logging.getLogger(__name__)
 
-if sys.platform == "win32":
-    sys.coinit_flags = 0
-    from win32com.client import Dispatch
-    from pywintypes import com_error
-else:
-    log.warning("Not on Windows. ASCOM FOCUSER will not work.")
+FocuserStatus = Enum("OK", "ABORTED", "TIMEOUT", "ERROR")
+
+#: moves whose status can still be asked for by number.
+MOVES_KEPT = 20
+
+
+class MoveHandle(object):
+    """
+    Handle of a focuser move started with ``wait=False``. It only holds a proxy to the focuser and the move number,
+    so it works through Pyro too.
+    """
+
+    def __init__(self, focuser, number):
+        self.focuser = focuser
+        self.number = number
+
+    def wait(self, timeout=None):
+        """
+        :return: FocuserStatus of the move, None if it is still moving after ``timeout`` seconds.
+        """
+        return self.focuser.waitMove(timeout, self.number)
+
+    def done(self):
+        return self.focuser.getMoveStatus(self.number) is not None
+
+    def status(self):
+        """
+        :return: FocuserStatus of the move, None while moving.
+        """
+        return self.focuser.getMoveStatus(self.number)
+
+    def cancel(self):
+        return self.focuser.abortMove(self.number)
 
 
 class ASCOMFocuser(FocuserBase):
-    __config__ = {"ascom_id": 'FocusSim.Focuser'}
+    __config__ = {"ascom_id": 'FocusSim.Focuser',
+                  "transport": "com",                   # com, alpaca or sim
+                  "alpaca_server": "localhost:11111",
+                  "alpaca_device": 0,
+                  "driver_timeout": 60,                 # seconds to wait for a driver call
+                  "slow_call": 0,           # seconds, driver calls slower than this are logged, 0 disables
+                  "metrics_file": None,     # driver call metrics file, rewritten every metrics_interval seconds
+                  "metrics_interval": 60,
+                  "profile_file": "~/.chimera/ascom_profiles.json",
+                  "max_connection_attempts": 3,
+                  "heartbeat": 10,          # seconds between driver link checks, 0 checks only after failed calls
+                  "reconnect_backoff": 60,  # maximum seconds between reconnection attempts
+                  "telemetry_cadence": 0,   # seconds between telemetry polls, 0 disables the poller
+                  "telemetry_size": 3600,
+                  "move_timeout": 120}      # seconds
 
     def __init__(self):
         FocuserBase.__init__(self)
-
+        self._driver = DriverThread(self.__class__.__name__)
+        self._move = None
+        self._move_number = 0
+        self._move_numbers = itertools.count(1)
+        self._moves = collections.OrderedDict()  # number: Operation of the last moves
+        self._abort = threading.Event()
+        self._speed = None  # steps per second, learned from the completed moves
 
     def __start__(self):
+        t0 = time.time()
+        self._driver.name = self["ascom_id"]
+        self._driver.timeout = self["driver_timeout"]
+        self._driver.metrics.slow_threshold = self["slow_call"]
+        if self["metrics_file"]:
+            self._driver.metrics.start_export(self["metrics_file"], self["metrics_interval"])
+        self._supervisor = ConnectionSupervisor(self["ascom_id"], self._driver, lambda: dispatch(self, "focuser"),
+                                                link="Link", restore=self._restore, interval=self["heartbeat"],
+                                                attempts=self["max_connection_attempts"],
+                                                max_backoff=self["reconnect_backoff"])
         self.open()
+        self._supervisor.start()
+        self._profile = open_profile(self, self._ascom, "focuser")
 
-        self._supports = {FocuserFeature.TEMPERATURE_COMPENSATION: self._ascom.TempCompAvailable,
+        self._supports = {FocuserFeature.TEMPERATURE_COMPENSATION: self._capability("TempCompAvailable"),
                           FocuserFeature.POSITION_FEEDBACK: True,  # TODO: Check FEEDBACK
-                          FocuserFeature.ENCODER: self._ascom.Absolute,
+                          FocuserFeature.ENCODER: self._capability("Absolute"),
                           FocuserFeature.CONTROLLABLE_X: False,
                           FocuserFeature.CONTROLLABLE_Y: False,
                           FocuserFeature.CONTROLLABLE_Z: True,
@@ -36,63 +109,191 @@ class ASCOMFocuser(FocuserBase):
                           FocuserFeature.CONTROLLABLE_V: False,
                           FocuserFeature.CONTROLLABLE_W: False}
 
+        self._telemetry = TelemetryPoller(self["ascom_id"], lambda: self._driver.proxy(TELEMETRY),
+                                          ("Position", "IsMoving", "Temperature"),
+                                          self["telemetry_cadence"], self["telemetry_size"])
+        self._telemetry.start()
+
         self._position = self.getPosition()
         self["focuser_model"] = 'ASCOM standard focuser id %s' % self['ascom_id']
         self["model"] = self["focuser_model"]
 
-    @lock
-    def moveIn(self, n, axis=FocuserAxis.Z):
-        # Check if axis is on the permitted axis list
-        self._checkAxis(axis)
+        self._startup_stats = {"startup_time": time.time() - t0,
+                               "profile": "warm" if self._profile.warm else "cold",
+                               "driver_reads": self._profile.driver_reads}
+        self.log.info("Started in %(startup_time).2f s, %(profile)s profile, %(driver_reads)d capability reads." %
+                      self._startup_stats)
+        if self._profile.warm:  # check the stored capabilities in background
+            Operation("%s profile check" % self["ascom_id"]).run(self._profile.verify, self._ascom)
+        else:
+            self._profile.save()
 
-        target = self.getPosition() - n
+    def _capability(self, member):
+        return self._profile.read(self._ascom, member)
 
-        if self._inRange(target):
-            self._setPosition(target)
-        else:
-            raise InvalidFocusPositionException("%d is outside focuser boundaries." % target)
+    def getStartupStats(self):
+        """
+        Returns the startup time, whether the capability profile was warm or cold and the capability reads done.
+        """
+        return self._startup_stats
 
-    @lock
-    def moveOut(self, n, axis=FocuserAxis.Z):
+    def __stop__(self):
+        self._supervisor.stop()
+        self._telemetry.stop()
+        self._driver.stop()
+        self._driver.metrics.stop_export()
+        if self["metrics_file"]:
+            self._driver.metrics.write(self["metrics_file"])
+
+    @com
+    def moveIn(self, n, axis=FocuserAxis.Z, wait=True):
         # Check if axis is on the permitted axis list
         self._checkAxis(axis)
 
-        target = self.getPosition() + n
+        return self._finishMove(self._startMove(steps=-n), wait)
 
-        if self._inRange(target):
-            self._setPosition(target)
-        else:
-            raise InvalidFocusPositionException("%d is outside focuser boundaries." % target)
+    @com
+    def moveOut(self, n, axis=FocuserAxis.Z, wait=True):
+        # Check if axis is on the permitted axis list
+        self._checkAxis(axis)
 
-    @lock
-    def moveTo(self, position, axis=FocuserAxis.Z):
+        return self._finishMove(self._startMove(steps=n), wait)
+
+    @com
+    def moveTo(self, position, axis=FocuserAxis.Z, wait=True):
+        """
+        Moves the focuser to ``position``. With ``wait=False`` returns a MoveHandle as soon as the move starts, its
+        status tells whether the move reached the position.
+        """
         # Check if axis is on the permitted axis list
         self._checkAxis(axis)
 
-        if self._inRange(position):
-            self._setPosition(position)
-        else:
-            raise InvalidFocusPositionException("%d is outside focuser boundaries." % int(position))
+        return self._finishMove(self._startMove(position), wait)
 
-    @lock
+    @com
     def getPosition(self, axis=FocuserAxis.Z):
         # Check if axis is on the permitted axis list
         self._checkAxis(axis)
 
-        return int(self._ascom.Position)
+        return int(self._telemetry.value("Position", lambda: self._ascom.Position))
 
+    @com
     def getRange(self, axis=FocuserAxis.Z):
         # Check if axis is on the permitted axis list
         self._checkAxis(axis)
 
-        return 0, int(self._ascom.MaxStep)
+        return 0, int(self._capability("MaxStep"))
+
+    @lock
+    def _startMove(self, position=None, steps=0):
+        """
+        Starts the move to ``position``, or ``steps`` away from the current position. Only this is done under the
+        instrument lock, moves are waited for outside it, so that getPosition, isMoving and abortMove answer meanwhile.
+
+        :return: number of the move.
+        """
+        target = int(self._ascom.Position) + steps if position is None else position
+        if not self._inRange(target):
+            raise InvalidFocusPositionException("%d is outside focuser boundaries." % int(target))
+        return self._setPosition(target)
+
+    def _finishMove(self, number, wait):
+        if not wait:
+            return MoveHandle(self.getProxy(), number)
+        return self._moves[number].wait() == FocuserStatus.OK
 
     def _setPosition(self, n):
+        if self.isMoving():
+            raise ChimeraException("Focuser is already moving.")
+
         self.log.info("Changing focuser to %s" % n)
+        self._abort.clear()
         self._ascom.Move(n)
-        while self._ascom.IsMoving:
-            pass  # FIXME: Add a timeout? Add an ABORT?!
-        self._position = self._ascom.Position
+        self._telemetry.invalidate()
+
+        expected = abs(n - self._position) / self._speed if self._speed else None
+        number = self._move_number = next(self._move_numbers)
+        self._move = self._moves[number] = Operation("Focuser move to %d" % n, cancel=self.abortMove)
+        while len(self._moves) > MOVES_KEPT:
+            self._moves.popitem(last=False)
+        self._move.run(self._waitMove, n, expected)
+        return number
+
+    def _waitMove(self, target, expected):
+        start = self._position
+        status = FocuserStatus.OK
+        try:
+            if not poll(lambda: not self._ascom.IsMoving, self["move_timeout"], self._abort, expected):
+                status = FocuserStatus.ABORTED
+        except OperationTimeout:
+            self.log.error("Focuser move to %d timed out after %d s, halting." % (target, self["move_timeout"]))
+            self._halt()
+            status = FocuserStatus.TIMEOUT
+        self._telemetry.invalidate()
+
+        self._position = int(self._ascom.Position)
+        if status == FocuserStatus.OK and self._position != start and self._move.elapsed > 0:
+            speed = abs(self._position - start) / self._move.elapsed
+            self._speed = speed if self._speed is None else 0.5 * (self._speed + speed)
+
+        self.moveComplete(self._position, status)
+        return status
+
+    def _halt(self):
+        try:
+            self._ascom.Halt()
+        except DRIVER_ERRORS, e:
+            self.log.warning("Could not halt focuser: %s" % e)
+
+    def isMoving(self):
+        return self._move is not None and not self._move.done()
+
+    def waitMove(self, timeout=None, number=None):
+        """
+        Waits for the current move (or move ``number``) to finish.
+
+        :return: FocuserStatus of the move (OK if there was none), None if it is still moving after ``timeout``
+            seconds.
+        """
+        move = self._moveOperation(number)
+        if move is None:
+            return FocuserStatus.OK
+        try:
+            move.wait(timeout)
+        except OperationTimeout:
+            return None
+        except Exception:
+            return FocuserStatus.ERROR  # already logged, or raised to the caller that waited for the move
+        return move.result
+
+    def getMoveStatus(self, number=None):
+        """
+        :return: FocuserStatus of the current move (or move ``number``), None while moving.
+        """
+        move = self._moveOperation(number)
+        if move is not None and not move.done():
+            return None
+        return self.waitMove(0, number)
+
+    def _moveOperation(self, number):
+        if number is None:
+            return self._move
+        if number not in self._moves:
+            raise ChimeraException("Unknown focuser move %d, only the last %d are kept." % (number, MOVES_KEPT))
+        return self._moves[number]
+
+    def abortMove(self, number=None):
+        if number is not None and number != self._move_number:
+            return False
+        if not self.isMoving():
+            return False
+        self._abort.set()
+        self._halt()
+        return True
+
+    @event
+    def moveComplete(self, position, status):
+        pass
 
     def _inRange(self, n):
         min_pos, max_pos = self.getRange()
@@ -100,13 +301,47 @@ class ASCOMFocuser(FocuserBase):
 
     def open(self):
         try:
-            self._ascom = Dispatch(self['ascom_id'])
-            self._ascom.Link = True
-        except com_error:
-            self.log.error(
-                "Couldn't instantiate ASCOM %d COM objects." % self["telescope_id"])
-            return False
+            self._supervisor.connect()
+        except ConnectionFailed, e:
+            raise ChimeraException(str(e))
+        self._ascom = self._driver.proxy()
 
+    def _restore(self):
+        # a move in progress was lost with the link
+        self._position = int(self._ascom.Position)
+        self._telemetry.invalidate()
+
+    @com
     def getTemperature(self):
         # FIXME: Raises an exception if ambient temperature is not available
-        return self._ascom.Temperature
+        return self._telemetry.value("Temperature", lambda: self._ascom.Temperature)
+
+    def getTelemetry(self, since=None):
+        """
+        Returns the telemetry samples newer than ``since`` (unix time) as {"time": [...], property: [...]}.
+        """
+        return self._telemetry.since(since)
+
+    def getDriverStats(self):
+        """
+        Returns the driver thread queue depth and the wait times per request priority.
+        """
+        return self._driver.stats()
+
+    def getConnectionStats(self):
+        """
+        Returns whether the driver is connected, the reconnections done, the total downtime and the last error.
+        """
+        return self._supervisor.stats()
+
+    def getMetrics(self):
+        """
+        Returns call counts, error counts and latency histograms of the driver calls, per ASCOM member.
+        """
+        return self._driver.metrics.stats()
+
+    def writeMetrics(self, path=None):
+        """
+        Writes the driver call metrics, in the Prometheus text format, to ``path`` (default: metrics_file).
+        """
+        self._driver.metrics.write(path or self["metrics_file"])
@@ -19,10 +19,13 @@
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA
 # 02110-1301, USA.
 
-import sys
 import threading
 import logging
 import time
+import itertools
+import collections
+
+import numpy as np
 
 from chimera.core.exceptions import ChimeraException
 from chimera.util.coord import Coord
@@ -30,41 +33,76 @@ from chimera.util.position import Position, Epoch
 from chimera.instruments.telescope import TelescopeBase
 from chimera.interfaces.telescope import TelescopeStatus, TelescopePier, TelescopePierSide, TelescopeCover
 
-log = logging.getLogger(__name__)
-
-if sys.platform == "win32":
-    sys.coinit_flags = 0  # TODO: check why this?
+from chimera_ascom.instruments.com import com
+from chimera_ascom.util.coords import angular_distance, julian_date, precess_j2000, horizontal
+from chimera_ascom.util.driver import DriverThread, TELEMETRY
+from chimera_ascom.util.operation import Operation, OperationTimeout, poll
+from chimera_ascom.util.snapshot import StateCache
+from chimera_ascom.util.supervisor import ConnectionSupervisor, ConnectionFailed
+from chimera_ascom.util.telemetry import TelemetryPoller
+from chimera_ascom.util.transport import dispatch, DRIVER_ERRORS
 
-    from win32com.client import Dispatch
-    from pywintypes import com_error
-
-else:
-    log.warning("Not on Windows. ASCOM Telescope will not work.")
+log = logging.getLogger(__name__)
 
 
-def com(func):
+class SlewHandle(object):
     """
-    Wrapper decorator used to handle COM objects errors.
-    Every method that use COM method should be decorated.
+    Handle of an asynchronous slew, returned by slewToRaDecAsync and slewToAltAzAsync. It only holds a proxy to the
+    telescope and the slew number, so it works through Pyro too.
     """
 
-    def com_wrapper(*args, **kwargs):
+    def __init__(self, telescope, number):
+        self.telescope = telescope
+        self.number = number
 
-        try:
-            return func(*args, **kwargs)
-        except com_error, e:
-            raise ChimeraException(str(e))
+    def wait(self, timeout=None):
+        """
+        :return: True if the slew finished, False if it is still slewing after ``timeout`` seconds.
+        """
+        return self.telescope.waitSlew(timeout, self.number)
+
+    def done(self):
+        return self.telescope.getSlewProgress(self.number)["done"]
+
+    def progress(self):
+        """
+        Returns the angular distance, in degrees, still to go (None once a newer slew started).
+        """
+        return self.telescope.getSlewProgress(self.number).get("remaining")
 
-    return com_wrapper
+    def cancel(self):
+        return self.telescope.abortSlew(self.number)
 
 
 class ASCOMTelescope(TelescopeBase, TelescopeCover, TelescopePier):
-    __config__ = {"ascom_id": "ASCOM.Simulator.Telescope"}
+    __config__ = {"ascom_id": "ASCOM.Simulator.Telescope",
+                  "transport": "com",                   # com, alpaca or sim
+                  "alpaca_server": "localhost:11111",
+                  "alpaca_device": 0,
+                  "driver_timeout": 60,                 # seconds to wait for a driver call
+                  "slow_call": 0,           # seconds, driver calls slower than this are logged, 0 disables
+                  "metrics_file": None,     # driver call metrics file, rewritten every metrics_interval seconds
+                  "metrics_interval": 60,
+                  "max_connection_attempts": 3,
+                  "heartbeat": 10,          # seconds between driver link checks, 0 checks only after failed calls
+                  "reconnect_backoff": 60,  # maximum seconds between reconnection attempts
+                  "state_ttl": 0.2,     # seconds a state snapshot is served before being read again
+                  "slew_rate": 2.0,         # degrees per second, first guess of the slew speed, then learned
+                  "slew_poll": 0.5,         # maximum seconds between Slewing polls
+                  "slew_timeout": 600,      # seconds
+                  "settle_time": 0,         # seconds the position must be stable after a slew, 0 disables
+                  "settle_tolerance": 2.0,  # arcseconds
+                  "settle_timeout": 30,     # seconds
+                  "min_altitude": 0,        # degrees, lower targets are not reachable
+                  "prepare_ttl": 30,        # seconds prepareTargets results are reused
+                  "telemetry_cadence": 0,   # seconds between telemetry polls, 0 disables the poller
+                  "telemetry_size": 3600}
 
     def __init__(self):
         TelescopeBase.__init__(self)
 
         self._abort = threading.Event()
+        self._driver = DriverThread(self.__class__.__name__)
 
         self._ascom = None
         self._ascom = None
@@ -72,66 +110,113 @@ class ASCOMTelescope(TelescopeBase, TelescopeCover, TelescopePier):
         self._target = None
         self._isFanning = None
         self._isOpen = None
+        self._slews = collections.deque(maxlen=100)
+        self._slew_rate = None
+        self._slew_op = None
+        self._slew_info = None
+        self._slew_number = 0
+        self._slew_numbers = itertools.count(1)
+        self._prepared = {}
+        self._tracking = None  # last tracking state set, restored on reconnection
+
+        self._state = StateCache(lambda: self._ascom,
+                                 groups=[("RightAscension", "Declination", "Altitude", "Azimuth", "SideOfPier"),
+                                         ("Slewing", "Tracking", "AtPark")],
+                                 static=("CanSlew", "CanSlewAltAz", "CanSlewAsync", "CanSlewAltAzAsync",
+                                         "CanSetTracking", "CanSetPierSide", "CanPark", "CanFindHome",
+                                         "SiteLatitude"))
 
     @com
     def __start__(self):
+        self._driver.name = self["ascom_id"]
+        self._driver.timeout = self["driver_timeout"]
+        self._driver.metrics.slow_threshold = self["slow_call"]
+        if self["metrics_file"]:
+            self._driver.metrics.start_export(self["metrics_file"], self["metrics_interval"])
+        self._state.ttl = self["state_ttl"]
+        self._slew_rate = self["slew_rate"]
+        self._supervisor = ConnectionSupervisor(self["ascom_id"], self._driver, lambda: dispatch(self, "telescope"),
+                                                restore=self._restore, interval=self["heartbeat"],
+                                                attempts=self["max_connection_attempts"],
+                                                max_backoff=self["reconnect_backoff"])
         self.open()
+        self._supervisor.start()
+
+        # telemetry samples feed the state snapshot, so getters are served from the newest sample
+        self._telemetry = TelemetryPoller(self["ascom_id"], lambda: self._driver.proxy(TELEMETRY),
+                                          ("RightAscension", "Declination", "Altitude", "Azimuth", "SideOfPier",
+                                           "Slewing", "Tracking", "AtPark"),
+                                          self["telemetry_cadence"], self["telemetry_size"], self._state.feed)
+        if self["telemetry_cadence"] > 0:
+            self._state.ttl = max(self["state_ttl"], 2 * self["telemetry_cadence"])
+            self._telemetry.start()
         super(ASCOMTelescope, self).__start__()
         return True
 
     @com
     def __stop__(self):
+        self._supervisor.stop()
+        self._telemetry.stop()
         self.close()
+        self._driver.stop()
+        self._driver.metrics.stop_export()
+        if self["metrics_file"]:
+            self._driver.metrics.write(self["metrics_file"])
         super(ASCOMTelescope, self).__stop__()
         return True
 
     @com
     def open(self):
         try:
-            self._ascom = Dispatch(self['ascom_id'])
-            self._ascom.Connected = True
-        except com_error:
-            self.log.error(
-                "Couldn't instantiate ASCOM %d COM objects." % self["ascom_id"])
-            return False
+            self._supervisor.connect()
+        except ConnectionFailed, e:
+            raise ChimeraException(str(e))
+        self._ascom = self._driver.proxy()
+        self._state.invalidate(static=True)
 
         return self.unpark()
 
-    @com
+    def _restore(self):
+        """
+        Reapplies the telescope settings after a reconnection.
+        """
+        self._state.invalidate(static=True)
+        if self._tracking is not None and self._state.get("CanSetTracking"):
+            self._ascom.Tracking = self._tracking
+
     def close(self):
+        try:
+            self._ascom.Connected = False
+            self._ascom.Dispose()
+        except DRIVER_ERRORS, e:
+            self.log.error("Couldn't disconnect from ASCOM: %s" % e)
+            return False
         return True
-        # try:
-        #     # self._ascom.Disconnect()
-        #     # self._ascom.DisconnectTelescope()
-        #     # self._ascom.Disconnect()
-        #     self._ascom.Quit()
-        # except com_error:
-        #     self.log.error("Couldn't disconnect to ASCOM.")
-        #     return False
 
     @com
     def getRa(self):
-        return Coord.fromH(self._ascom.RightAscension)
+        return Coord.fromH(self._state.get("RightAscension"))
 
     @com
     def getDec(self):
-        return Coord.fromD(self._ascom.Declination)
+        return Coord.fromD(self._state.get("Declination"))
 
     @com
     def getAz(self):
-        return Coord.fromD(self._ascom.Azimuth)
+        return Coord.fromD(self._state.get("Azimuth"))
 
     @com
     def getAlt(self):
-        return Coord.fromD(self._ascom.Altitude)
+        return Coord.fromD(self._state.get("Altitude"))
 
     @com
     def getPositionRaDec(self):
-        return Position.fromRaDec(self._ascom.RightAscension, self._ascom.Declination, epoch=Epoch.NOW)
+        ra, dec = self._state.get_many(("RightAscension", "Declination"))
+        return Position.fromRaDec(ra, dec, epoch=Epoch.NOW)
 
     @com
     def getPositionAltAz(self):
-        return Position.fromAltAz(self._ascom.Altitude, self._ascom.Azimuth)
+        return Position.fromAltAz(*self._state.get_many(("Altitude", "Azimuth")))
 
     @com
     def getTargetRaDec(self):
@@ -140,7 +225,16 @@ class ASCOMTelescope(TelescopeBase, TelescopeCover, TelescopePier):
         return self._target
 
     @com
-    def slewToRaDec(self, position):
+    def slewToRaDec(self, position, wait=True):
+        """
+        Slews to ``position``. With ``wait=False`` returns as soon as the slew starts, see slewToRaDecAsync.
+        """
+        return self._slewToRaDec(position, wait) is not False
+
+    def _slewToRaDec(self, position, wait):
+        """
+        :return: number of the slew started, False if the telescope is already slewing.
+        """
 
         if self.isSlewing():
             self.log.error('Telescope is Slewing. Slew aborted.')
@@ -149,37 +243,36 @@ class ASCOMTelescope(TelescopeBase, TelescopeCover, TelescopePier):
         self._target = position
         self._abort.clear()
 
-        if not self._ascom.CanSlew:
+        can_slew = self._state.get("CanSlew")
+        at_park, tracking = self._state.get_many(("AtPark", "Tracking"))
+        if not can_slew:
             raise ChimeraException('Cannot Slew: Telescope does not slew.')
-        elif self._ascom.AtPark:
+        elif at_park:
             raise ChimeraException('Cannot Slew: Telescope is Parked')
-        elif not self._ascom.Tracking:
+        elif not tracking:
             raise ChimeraException('Cannot Slew: Telescope is Not Tracking')
+        self._checkAsync("SlewToCoordinates", "CanSlewAsync")
 
-        if self._ascom.CanSlew and not self._ascom.AtPark and self._ascom.Tracking:
-
-            self.slewBegin(position)
+        if can_slew and not at_park and tracking:
 
             # At least for ASA telescopes, (ra, dec) should be in NOW epoch, not J2000.
-            position = position.toEpoch(Epoch.NOW)
-            self.log.info("Telescope %s slewing to ra %3.2f and dec %3.2f" % (self['ascom_id'],
-                                                                              position.ra.H, position.dec.D))
-            self._ascom.SlewToCoordinates(position.ra.H, position.dec.D)
+            prepared = self._prepare(position)
+            if not prepared["reachable"]:
+                raise ChimeraException('Cannot Slew: target at altitude %.1f, below %.1f.' %
+                                       (prepared["alt"], self["min_altitude"]))
 
-            status = TelescopeStatus.OK
-
-            while self._ascom.Slewing:
+            self.slewBegin(position)
 
-                # [ABORT POINT]
-                if self._abort.isSet():
-                    status = TelescopeStatus.ABORTED
-                    break
+            target_ra, target_dec = prepared["ra"], prepared["dec"]
+            self.log.info("Telescope %s slewing to ra %3.2f and dec %3.2f" % (self['ascom_id'],
+                                                                              target_ra, target_dec))
 
-                time.sleep(self._idle_time)
+            def remaining():
+                ra, dec = self._state.get_many(("RightAscension", "Declination"))
+                return angular_distance(ra * 15, dec, target_ra * 15, target_dec)
 
-            self.slewComplete(self.getPositionRaDec(), status)
-            print 'Slew Complete'
-            self.log.info("Slew Complete.")
+            number = self._startSlew("ra %3.2f dec %3.2f" % (target_ra, target_dec), remaining, wait,
+                                     "SlewToCoordinatesAsync", target_ra, target_dec)
 
         else:
             self.log.info("Can't slew.")
@@ -192,10 +285,80 @@ class ASCOMTelescope(TelescopeBase, TelescopeCover, TelescopePier):
         #     print 'FIXME:'
         #     NotImplementedError()
 
-        return True
+        return number
 
     @com
-    def slewToAltAz(self, position):
+    def prepareTargets(self, targets):
+        """
+        Prepares a list of target Positions in one vectorized pass: apparent (NOW) coordinates, hour angle, current
+        altitude and azimuth, expected pier side, distance and estimated slew time from the current position, and
+        whether they are above ``min_altitude``. The results are reused by slewToRaDec for ``prepare_ttl`` seconds.
+
+        :return: list of {"ra" (hours), "dec", "ha" (hours), "alt", "az", "pier_side", "distance" (degrees),
+            "slew_time" (seconds), "reachable"}, in the order of ``targets``.
+        """
+        now = time.time()
+        for key in [key for key, entry in self._prepared.iteritems() if now - entry["time"] > self["prepare_ttl"]]:
+            del self._prepared[key]
+        if not targets:
+            return []
+
+        ra, dec = np.empty(len(targets)), np.empty(len(targets))
+        j2000 = np.zeros(len(targets), dtype=bool)
+        for i, target in enumerate(targets):
+            if target.epoch == Epoch.J2000:
+                j2000[i] = True
+            elif target.epoch != Epoch.NOW:  # rare epochs, one by one
+                target = target.toEpoch(Epoch.NOW)
+            ra[i], dec[i] = target.ra.D, target.dec.D
+        ra[j2000], dec[j2000] = precess_j2000(ra[j2000], dec[j2000], julian_date(now))
+
+        ha, alt, az = horizontal(ra, dec, self._ascom.SiderealTime, self._state.get("SiteLatitude"))
+        current_ra, current_dec = self._state.get_many(("RightAscension", "Declination"))
+        distance = angular_distance(current_ra * 15, current_dec, ra, dec)
+        slew_time = distance / self._slew_rate + self["settle_time"]
+        # the tube is west of the pier (pierWest) for targets east of the meridian
+        pier_side = np.where(ha < 0, str(TelescopePierSide.WEST), str(TelescopePierSide.EAST))
+        reachable = alt >= self["min_altitude"]
+
+        columns = {"ra": ra / 15., "dec": dec, "ha": ha, "alt": alt, "az": az, "pier_side": pier_side,
+                   "distance": distance, "slew_time": slew_time, "reachable": reachable}
+        columns = dict((name, values.tolist()) for name, values in columns.iteritems())
+        prepared = [dict((name, values[i]) for name, values in columns.iteritems()) for i in range(len(targets))]
+        for target, entry in zip(targets, prepared):
+            self._prepared[self._targetKey(target)] = dict(entry, time=now)
+        return prepared
+
+    def _targetKey(self, position):
+        return round(position.ra.D, 6), round(position.dec.D, 6), str(position.epoch)
+
+    def _prepare(self, position):
+        entry = self._prepared.get(self._targetKey(position))
+        if entry is not None and time.time() - entry["time"] <= self["prepare_ttl"]:
+            return entry
+        return self.prepareTargets([position])[0]
+
+    def slewToRaDecAsync(self, position):
+        """
+        Starts a slew to ``position`` and returns at once a SlewHandle to follow it, or False if the telescope is
+        already slewing. slewBegin and slewComplete are fired as for slewToRaDec.
+        """
+        number = self._slewToRaDec(position, False)
+        if number is False:
+            return False
+        return SlewHandle(self.getProxy(), number)
+
+    @com
+    def slewToAltAz(self, position, wait=True):
+        """
+        Slews to ``position``. With ``wait=False`` returns as soon as the slew starts, see slewToAltAzAsync.
+        """
+        return self._slewToAltAz(position, wait) is not False
+
+    def _slewToAltAz(self, position, wait):
+        """
+        :return: number of the slew started, False if the telescope is already slewing.
+        """
 
         if self.isSlewing():
             self.log.error('Telescope is Slewing. Slew aborted.')
@@ -204,31 +367,24 @@ class ASCOMTelescope(TelescopeBase, TelescopeCover, TelescopePier):
         self._target = position
         self._abort.clear()
 
-        if not self._ascom.CanSlew:
+        if not self._state.get("CanSlew"):
             raise ChimeraException('Cannot Slew: Telescope does not slew.')
-        elif self._ascom.AtPark:
+        elif self._state.get("AtPark"):
             raise ChimeraException('Cannot Slew: Telescope is Parked')
+        self._checkAsync("SlewToAltAz", "CanSlewAltAzAsync")
         # elif not self._ascom.Tracking:  FIXME: Telescope should or should not be tracking to move?
         #     raise ChimeraException('Cannot Slew: Telescope is Not Tracking')
 
         self.slewBegin(position)
         self.log.info("Telescope %s slewing to alt %3.2f and az %3.2f" % (self['ascom_id'], position.alt.D, position.az.D))
-        self._ascom.SlewToAltAz(position.az.D, position.alt.D)
+        target_alt, target_az = position.alt.D, position.az.D
 
-        status = TelescopeStatus.OK
-
-        while self._ascom.Slewing:
+        def remaining():
+            alt, az = self._state.get_many(("Altitude", "Azimuth"))
+            return angular_distance(az, alt, target_az, target_alt)
 
-            # [ABORT POINT]
-            if self._abort.isSet():
-                status = TelescopeStatus.ABORTED
-                break
-
-            time.sleep(self._idle_time)
-
-        self.slewComplete(self.getPositionRaDec(), status)
-        print 'Slew Complete'
-        self.log.info("Slew Complete.")
+        number = self._startSlew("alt %3.2f az %3.2f" % (position.alt.D, position.az.D), remaining, wait,
+                                 "SlewToAltAzAsync", position.az.D, position.alt.D)
 
         #
         #     # except com_error:
@@ -237,7 +393,7 @@ class ASCOMTelescope(TelescopeBase, TelescopeCover, TelescopePier):
         #     print 'FIXME:'
         #     NotImplementedError()
 
-        return True
+        return number
 
         # if self.isSlewing():
         #     return False
@@ -259,33 +415,200 @@ class ASCOMTelescope(TelescopeBase, TelescopeCover, TelescopePier):
         #
         # return True
 
+    def slewToAltAzAsync(self, position):
+        """
+        Starts a slew to ``position`` and returns at once a SlewHandle to follow it, or False if the telescope is
+        already slewing. slewBegin and slewComplete are fired as for slewToAltAz.
+        """
+        number = self._slewToAltAz(position, False)
+        if number is False:
+            return False
+        return SlewHandle(self.getProxy(), number)
+
+    def _checkAsync(self, method, can_async):
+        # a synchronous slew would hold the driver thread, and every read waiting behind it, for the whole slew
+        if not self._capability(can_async):
+            raise ChimeraException("Cannot Slew: the driver has no %sAsync." % method)
+
+    def _startSlew(self, target, remaining, wait, method, *args):
+        """
+        Runs the slew, on the calling thread if ``wait``, else on a new one.
+
+        :param remaining: callable returning the angular distance (degrees) still to go.
+        :return: number of the slew.
+        """
+        distance = remaining()
+        expected = distance / self._slew_rate if self._slew_rate else None
+        number = self._slew_number = next(self._slew_numbers)
+        self._slew_info = {"number": number, "target": target, "distance": distance,
+                           "expected": expected, "remaining": remaining}
+
+        def run():
+            try:
+                status = self._slew(target, distance, expected, method, *args)
+            except DRIVER_ERRORS:
+                self._state.invalidate()
+                self.slewComplete(self.getPositionRaDec(), TelescopeStatus.ERROR)
+                raise
+            self.slewComplete(self.getPositionRaDec(), status)
+            self.log.info("Slew Complete.")
+            return status
+
+        self._slew_op = Operation("Slew to %s" % target, cancel=self.abortSlew)
+        if not wait:
+            self._slew_op.run(run)
+            return number
+        try:
+            self._slew_op.finish(run())
+        except Exception, e:
+            self._slew_op.finish(error=e)
+            raise
+        return number
+
+    def _slew(self, target, distance, expected, method, *args):
+        """
+        Starts the slew with the asynchronous driver ``method`` and waits for it with READ priority reads: Slewing is
+        polled more often as the end predicted from ``distance`` (degrees) and the learned slew rate approaches, and,
+        if ``settle_time`` is set, until the position is stable. Aborts end the wait at once.
+
+        :return: TelescopeStatus of the slew.
+        """
+        t0 = time.time()
+        getattr(self._ascom, method)(*args)
+        self._state.invalidate()
+
+        polls = [0]
+
+        def done():
+            polls[0] += 1
+            return not self._ascom.Slewing
+
+        status = TelescopeStatus.OK
+        try:
+            if not poll(done, self["slew_timeout"], self._abort, expected, max_interval=self["slew_poll"]):
+                status = TelescopeStatus.ABORTED
+        except OperationTimeout:
+            self.log.error("Slew to %s not done after %d s, aborting." % (target, self["slew_timeout"]))
+            self._ascom.AbortSlew()
+            status = TelescopeStatus.ERROR
+        slew_time = time.time() - t0
+
+        settle_time = 0.
+        if status == TelescopeStatus.OK and self["settle_time"] > 0:
+            settle_time = self._settle()
+        self._state.invalidate()
+
+        if status == TelescopeStatus.OK and distance > 1 and slew_time > 0:
+            rate = distance / slew_time
+            self._slew_rate = rate if self._slew_rate is None else 0.5 * (self._slew_rate + rate)
+
+        self._slews.append({"target": target, "start": t0, "distance": distance, "expected": expected,
+                            "slew_time": slew_time, "settle_time": settle_time, "polls": polls[0],
+                            "status": str(status)})
+        self.log.debug("Slew to %s: %.2f deg in %.2f s (expected %s), settled in %.2f s, %d polls." %
+                       (target, distance, slew_time, "%.2f s" % expected if expected else "unknown", settle_time,
+                        polls[0]))
+        return status
+
+    def _settle(self):
+        """
+        Waits until RA/Dec stay within ``settle_tolerance`` for ``settle_time`` seconds, at most ``settle_timeout``.
+
+        :return: seconds waited.
+        """
+        t0 = time.time()
+        tolerance = self["settle_tolerance"] / 3600.
+        reference = self._ascom.RightAscension * 15, self._ascom.Declination
+        stable_since = t0
+        while time.time() - t0 < self["settle_timeout"]:
+            if self._abort.wait(self["settle_time"] / 4.) or self._abort.isSet():
+                break
+            now = time.time()
+            current = self._ascom.RightAscension * 15, self._ascom.Declination
+            if angular_distance(reference[0], reference[1], current[0], current[1]) > tolerance:
+                reference, stable_since = current, now
+            elif now - stable_since >= self["settle_time"]:
+                break
+        else:
+            self.log.warning("Telescope not settled after %d s." % self["settle_timeout"])
+        return time.time() - t0
+
+    def _capability(self, member):
+        try:
+            return self._state.get(member)
+        except (AttributeError,) + DRIVER_ERRORS:
+            return False
+
+    def getSlewStats(self):
+        """
+        Returns the last slews as a list of {"target", "start", "distance" (degrees), "expected", "slew_time",
+        "settle_time" (seconds), "polls", "status"}, and the learned slew rate (degrees per second).
+        """
+        return {"slews": list(self._slews), "slew_rate": self._slew_rate}
+
+    def waitSlew(self, timeout=None, number=None):
+        """
+        Waits for the current slew (or slew ``number``) to finish.
+
+        :return: True if the slew finished, False if it is still slewing after ``timeout`` seconds.
+        """
+        if self._slew_op is None or (number is not None and number != self._slew_number):
+            return True
+        try:
+            self._slew_op.wait(timeout)
+        except OperationTimeout:
+            return False
+        except Exception:
+            pass  # failed slews are finished too, the error was already logged or raised to the caller
+        return True
+
+    @com
+    def getSlewProgress(self, number=None):
+        """
+        Returns {"number", "target", "distance" and "remaining" (degrees), "expected" and "elapsed" (seconds),
+        "done", "status"} of the current slew, or of slew ``number``.
+        """
+        if self._slew_op is None or (number is not None and number != self._slew_number):
+            return {"number": number, "done": True}
+        info = dict(self._slew_info, remaining=self._slew_info["remaining"](), elapsed=self._slew_op.elapsed,
+                    done=self._slew_op.done(), status=None)
+        if info["done"]:
+            info["status"] = "ERROR" if self._slew_op.error is not None else str(self._slew_op.result)
+        return info
+
     @com
-    def abortSlew(self):
+    def abortSlew(self, number=None):
+        if number is not None and number != self._slew_number:
+            return False
         if self.isSlewing():
             self._abort.set()
-            time.sleep(self._idle_time)
             self._ascom.AbortSlew()
+            self._state.invalidate()
             return True
 
         return False
 
     @com
     def isSlewing(self):
-        return self._ascom.Slewing
+        if self._slew_op is not None and not self._slew_op.done():
+            return True
+        return self._state.get("Slewing")
 
     @com
     def isTracking(self):
-        return self._ascom.Tracking == 1
+        return self._state.get("Tracking") == 1
 
     @com
     def park(self):
         self.stopTracking()
         self._ascom.Park()
+        self._state.invalidate()
 
     @com
     def unpark(self):
-        if self._ascom.AtPark:  # Is parked?
+        if self._state.get("AtPark"):  # Is parked?
             self._ascom.Unpark()
+            self._state.invalidate()
             try:
                 self._ascom.FindHome()
             except:
@@ -294,19 +617,23 @@ class ASCOMTelescope(TelescopeBase, TelescopeCover, TelescopePier):
 
     @com
     def isParked(self):
-        return self._ascom.AtPark
+        return self._state.get("AtPark")
 
     @com
     def startTracking(self):
-        if self._ascom.CanSetTracking:
+        if self._state.get("CanSetTracking"):
             self._ascom.Tracking = True
+            self._tracking = True
+            self._state.invalidate()
         else:
             return False
 
     @com
     def stopTracking(self):
-        if self._ascom.CanSetTracking:
+        if self._state.get("CanSetTracking"):
             self._ascom.Tracking = False
+            self._tracking = False
+            self._state.invalidate()
         else:
             return False
 
@@ -341,11 +668,12 @@ class ASCOMTelescope(TelescopeBase, TelescopeCover, TelescopePier):
         return self._isOpen
 
     def getPierSide(self):
-        if self._ascom.SideOfPier == -1:
+        side = self._state.get("SideOfPier")
+        if side == -1:
             return TelescopePierSide.UNKNOWN
-        elif self._ascom.SideOfPier == 0:
+        elif side == 0:
             return TelescopePierSide.EAST
-        elif self._ascom.SideOfPier == 1:
+        elif side == 1:
             return TelescopePierSide.WEST
 
     def setPierSide(self, side):
@@ -353,10 +681,12 @@ class ASCOMTelescope(TelescopeBase, TelescopeCover, TelescopePier):
             if side == TelescopePierSide.WEST:
                 self.log.debug('Moving telescope to WEST pierside...')
                 self._ascom.SideOfPier = 0
+                self._state.invalidate()
                 return True
             elif side == TelescopePierSide.EAST:
                 self.log.debug('Moving telescope to EAST pierside...')
                 self._ascom.SideOfPier = 1  # can ASA having exchanged values? Pierside=1 <-> AutoSlew=EAST
+                self._state.invalidate()
                 return True
         else:
             raise NotImplementedError()
@@ -406,6 +736,42 @@ class ASCOMTelescope(TelescopeBase, TelescopeCover, TelescopePier):
             #     self._ascom.Asynchronous = 1
             #
 
+    def getTelemetry(self, since=None):
+        """
+        Returns the telemetry samples newer than ``since`` (unix time) as {"time": [...], property: [...]}.
+        """
+        return self._telemetry.since(since)
+
+    def getDriverStats(self):
+        """
+        Returns the driver thread queue depth and the wait times per request priority.
+        """
+        return self._driver.stats()
+
+    def getConnectionStats(self):
+        """
+        Returns whether the driver is connected, the reconnections done, the total downtime and the last error.
+        """
+        return self._supervisor.stats()
+
+    def getMetrics(self):
+        """
+        Returns call counts, error counts and latency histograms of the driver calls, per ASCOM member.
+        """
+        return self._driver.metrics.stats()
+
+    def writeMetrics(self, path=None):
+        """
+        Writes the driver call metrics, in the Prometheus text format, to ``path`` (default: metrics_file).
+        """
+        self._driver.metrics.write(path or self["metrics_file"])
+
+    def getStateCacheStats(self):
+        """
+        Returns hits and misses per property of the state snapshot cache and the driver reads per second.
+        """
+        return self._state.stats()
+
     def getMetadata(self, request):
         md = super(ASCOMTelescope, self).getMetadata(request)
         md.append(('PIERSIDE', self.getPierSide().__str__(), 'Side-of-pier'))
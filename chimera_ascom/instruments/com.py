@@ -0,0 +1,24 @@
+import functools
+
+from chimera.core.exceptions import ChimeraException
+
+from chimera_ascom.util.transport import DRIVER_ERRORS
+
+
+def com(func):
+    """
+    Wrapper decorator used to handle COM objects errors.
+    Every method that use COM method should be decorated.
+
+    Driver calls themselves are counted and timed, per member, by the DriverThread metrics of the instrument.
+    """
+
+    @functools.wraps(func)
+    def com_wrapper(*args, **kwargs):
+
+        try:
+            return func(*args, **kwargs)
+        except DRIVER_ERRORS, e:
+            raise ChimeraException(str(e))
+
+    return com_wrapper
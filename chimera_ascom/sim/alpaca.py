@@ -0,0 +1,128 @@
+# Based on https://ascom-standards.org/api/
+
+import json
+import logging
+import itertools
+import threading
+import urlparse
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+from SocketServer import ThreadingMixIn
+
+import numpy as np
+
+from chimera_ascom.util.transport import AlpacaDevice, make_imagebytes, ALPACA_NOT_IMPLEMENTED
+
+log = logging.getLogger(__name__)
+
+ALPACA_DRIVER_ERROR = 0x500
+
+
+class AlpacaServer(ThreadingMixIn, HTTPServer):
+    """
+    Stand-in Alpaca server exposing plain Python objects as Alpaca devices, to exercise the Alpaca transport
+    without hardware.
+
+    :param devices: {(device type, device number): object with the ASCOM members of the device}.
+    :param address: (host, port) to listen on, port 0 picks a free port.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, devices, address=("localhost", 0)):
+        HTTPServer.__init__(self, address, AlpacaHandler)
+        self.devices = devices
+        self.transaction_ids = itertools.count(1)
+        self._thread = None
+
+    @property
+    def address(self):
+        """
+        ``alpaca_server`` configuration value of this server.
+        """
+        return "%s:%d" % self.server_address
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, name="AlpacaServer")
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class AlpacaHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"  # keep-alive
+
+    def log_message(self, format, *args):
+        log.debug(format % args)
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        self._handle(url.path, urlparse.parse_qs(url.query))
+
+    def do_PUT(self):
+        body = self.rfile.read(int(self.headers.getheader("content-length", 0)))
+        self._handle(self.path, urlparse.parse_qs(body))
+
+    def _handle(self, path, params):
+        params = dict((k.lower(), _parse(v[0])) for k, v in params.iteritems())
+        parts = path.strip("/").split("/")
+        if len(parts) != 5 or parts[:2] != ["api", "v1"] or (parts[2], int(parts[3])) not in self.server.devices:
+            return self._send(400, "text/plain", "Unknown device %s" % path)
+        device_type, member = parts[2], parts[4]
+        device = self.server.devices[(device_type, int(parts[3]))]
+        methods = dict(AlpacaDevice.methods["common"], **AlpacaDevice.methods[device_type])
+
+        response = {"ClientTransactionID": params.get("clienttransactionid", 0),
+                    "ServerTransactionID": next(self.server.transaction_ids),
+                    "ErrorNumber": 0, "ErrorMessage": ""}
+        try:
+            name = _member(device, methods, member)
+            if self.command == "GET":
+                value = getattr(device, name)
+                if isinstance(value, np.ndarray) and "application/imagebytes" in self.headers.getheader("accept", ""):
+                    return self._send(200, "application/imagebytes",
+                                      make_imagebytes(value, response["ClientTransactionID"],
+                                                      response["ServerTransactionID"]))
+                if isinstance(value, np.ndarray):
+                    response.update(Type=2, Rank=value.ndim)
+                response["Value"] = value.tolist() if hasattr(value, "tolist") else value
+            elif name in methods:
+                getattr(device, name)(*[params[p.lower()] for p in methods[name]])
+            else:
+                setattr(device, name, params[name.lower()])
+        except (AttributeError, NotImplementedError), e:
+            response.update(ErrorNumber=ALPACA_NOT_IMPLEMENTED, ErrorMessage=str(e))
+        except Exception, e:
+            response.update(ErrorNumber=ALPACA_DRIVER_ERROR, ErrorMessage=str(e))
+
+        self._send(200, "application/json", json.dumps(response))
+
+    def _send(self, status, content_type, data):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _member(device, methods, member):
+    for name in itertools.chain(methods, dir(device)):
+        if name.lower() == member and not name.startswith("_"):
+            return name
+    raise AttributeError("%s not implemented" % member)
+
+
+def _parse(value):
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    for kind in (int, float):
+        try:
+            return kind(value)
+        except ValueError:
+            pass
+    return value
@@ -0,0 +1,389 @@
+# Based on http://www.ascom-standards.org/Help/Developer/html/N_ASCOM_DeviceInterface.htm
+
+import math
+import time
+import logging
+import types
+import threading
+import collections
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class SimDevice(object):
+    """
+    Pure Python stand-in for an ASCOM driver object. Every access to an ASCOM member (a capitalized attribute: property
+    read, property write or method call) from outside the device is counted in ``calls`` and takes ``latency``
+    seconds, like a COM round trip.
+
+    :param latency: seconds spent on each driver call.
+    """
+
+    Description = "Simulated device"
+    DriverVersion = "1.0"
+
+    def __init__(self, latency=0.):
+        self.__dict__.update(latency=latency, calls=collections.Counter(), _calls_lock=threading.Lock(),
+                             _local=threading.local(), Connected=False)
+
+    def __getattribute__(self, name):
+        if not name[:1].isupper() or object.__getattribute__(self, "_inside")():
+            return object.__getattribute__(self, name)
+        value = self._driver_call(name, object.__getattribute__, self, name)
+        if isinstance(value, types.MethodType):
+            return lambda *args: self._driver_call(None, value, *args)
+        return value
+
+    def __setattr__(self, name, value):
+        if not name[:1].isupper() or self._inside():
+            object.__setattr__(self, name, value)
+        else:
+            self._driver_call(name, object.__setattr__, self, name, value)
+
+    def _inside(self):
+        return getattr(self._local, "depth", 0) > 0
+
+    def _driver_call(self, name, func, *args):
+        # the device own member accesses, done inside a call, are not counted
+        if name is not None:
+            with self._calls_lock:
+                self.calls[name] += 1
+            if self.latency:
+                time.sleep(self.latency)
+        self._local.depth = getattr(self._local, "depth", 0) + 1
+        try:
+            return func(*args)
+        finally:
+            self._local.depth -= 1
+
+    def call_count(self):
+        """
+        Total driver calls since created or reset.
+        """
+        with self._calls_lock:
+            return sum(self.calls.values())
+
+    def reset(self):
+        with self._calls_lock:
+            self.calls.clear()
+
+    def SetupDialog(self):
+        pass
+
+    def Dispose(self):
+        pass
+
+    def Action(self, name, parameters=""):
+        return ""
+
+
+class Motion(object):
+    """
+    Linear move of a value (or a tuple of values) from ``start`` to ``target`` taking ``duration`` seconds.
+    """
+
+    def __init__(self, start, target, duration):
+        self.start = start
+        self.target = target
+        self.duration = max(duration, 0.)
+        self.started = time.time()
+
+    def value(self):
+        if not self.moving():
+            return self.target
+        f = (time.time() - self.started) / self.duration
+        if isinstance(self.start, tuple):
+            return tuple(s + (t - s) * f for s, t in zip(self.start, self.target))
+        return self.start + (self.target - self.start) * f
+
+    def moving(self):
+        return time.time() - self.started < self.duration
+
+    def stop(self):
+        self.start = self.target = self.value()
+        self.duration = 0.
+
+
+class SimTelescope(SimDevice):
+    """
+    Equatorial mount. Slews take the longest axis distance over ``slew_rate`` plus ``settle_time`` seconds. The
+    pointing stays fixed in RA/Dec, tracking or not.
+
+    :param latitude: site latitude, degrees.
+    :param longitude: site longitude, degrees east.
+    :param slew_rate: degrees per second on each axis.
+    :param settle_time: seconds added to every slew.
+    """
+
+    Description = "Simulated telescope"
+    CanSlew = CanSlewAsync = CanSlewAltAz = CanSlewAltAzAsync = CanSync = True
+    CanSetTracking = CanPark = CanUnpark = CanFindHome = CanSetPierSide = True
+
+    def __init__(self, latency=0., latitude=-27.6, longitude=-48.5, slew_rate=5., settle_time=0.):
+        SimDevice.__init__(self, latency)
+        self.__dict__.update(SiteLatitude=latitude, SiteLongitude=longitude, _slew_rate=slew_rate,
+                             _settle_time=settle_time, Tracking=True, AtPark=False, TargetRightAscension=0.,
+                             TargetDeclination=0., _park=(90., 0.))
+        self.__dict__["_motion"] = Motion(self._equatorial(*self._park), self._equatorial(*self._park), 0.)
+        self.reset()
+
+    @property
+    def SiderealTime(self):
+        days = time.time() / 86400. + 2440587.5 - 2451545.
+        return (18.697374558 + 24.06570982441908 * days + self.SiteLongitude / 15.) % 24
+
+    @property
+    def RightAscension(self):
+        return self._motion.value()[0] % 24
+
+    @property
+    def Declination(self):
+        return self._motion.value()[1]
+
+    @property
+    def Altitude(self):
+        return self._horizontal(*self._motion.value())[0]
+
+    @property
+    def Azimuth(self):
+        return self._horizontal(*self._motion.value())[1]
+
+    @property
+    def Slewing(self):
+        return self._motion.moving()
+
+    @property
+    def SideOfPier(self):
+        hour_angle = (self.SiderealTime - self.RightAscension + 12) % 24 - 12
+        return 0 if hour_angle < 0 else 1
+
+    def SlewToCoordinatesAsync(self, ra, dec):
+        self.TargetRightAscension, self.TargetDeclination = ra, dec
+        self._slew((ra, dec))
+
+    def SlewToCoordinates(self, ra, dec):
+        self.SlewToCoordinatesAsync(ra, dec)
+        self._wait()
+
+    def SlewToAltAzAsync(self, az, alt):
+        self._slew(self._equatorial(alt, az))
+
+    def SlewToAltAz(self, az, alt):
+        self.SlewToAltAzAsync(az, alt)
+        self._wait()
+
+    def SyncToCoordinates(self, ra, dec):
+        self.__dict__["_motion"] = Motion((ra, dec), (ra, dec), 0.)
+
+    def AbortSlew(self):
+        self._motion.stop()
+
+    def Park(self):
+        self._slew(self._equatorial(*self._park))
+        self._wait()
+        self.AtPark = True
+
+    def Unpark(self):
+        self.AtPark = False
+
+    def FindHome(self):
+        pass
+
+    def _slew(self, target):
+        if self.AtPark:
+            raise ValueError("Telescope is parked.")
+        start = self._motion.value()
+        ra = (target[0] - start[0] + 12) % 24 - 12 + start[0]  # shortest way in RA
+        distance = max(abs(ra - start[0]) * 15, abs(target[1] - start[1]))
+        self.__dict__["_motion"] = Motion(start, (ra, target[1]), distance / self._slew_rate + self._settle_time)
+
+    def _wait(self):
+        while self._motion.moving():
+            time.sleep(0.01)
+
+    def _horizontal(self, ra, dec):
+        ha, dec, lat = math.radians((self.SiderealTime - ra) * 15), math.radians(dec), math.radians(self.SiteLatitude)
+        alt = math.asin(math.sin(dec) * math.sin(lat) + math.cos(dec) * math.cos(lat) * math.cos(ha))
+        az = math.atan2(-math.sin(ha) * math.cos(dec),
+                        math.sin(dec) * math.cos(lat) - math.cos(dec) * math.sin(lat) * math.cos(ha))
+        return math.degrees(alt), math.degrees(az) % 360
+
+    def _equatorial(self, alt, az):
+        alt, az, lat = math.radians(alt), math.radians(az), math.radians(self.SiteLatitude)
+        dec = math.asin(math.sin(alt) * math.sin(lat) + math.cos(alt) * math.cos(lat) * math.cos(az))
+        ha = math.atan2(-math.sin(az) * math.cos(alt),
+                        math.sin(alt) * math.cos(lat) - math.cos(alt) * math.sin(lat) * math.cos(az))
+        return (self.SiderealTime - math.degrees(ha) / 15) % 24, math.degrees(dec)
+
+
+class SimCamera(SimDevice):
+    """
+    CCD camera. Readout takes ``readout_time`` seconds for a full unbinned frame, proportionally less for binned or
+    windowed frames, and ``fast_factor`` of it in the "Fast" readout mode.
+
+    :param size: (CameraXSize, CameraYSize).
+    :param nested: publish ImageArray as nested tuples, like pywin32 does, instead of a numpy array.
+    """
+
+    Description = "Simulated camera"
+    ExposureMin = 0.001
+    ExposureMax = 3600.
+    MaxBinX = MaxBinY = 4
+    CanAsymmetricBin = False
+    CanAbortExposure = CanStopExposure = True
+    CanSetCCDTemperature = True
+    ElectronsPerADU = 1.5
+    PixelSizeX = PixelSizeY = 9.
+    ReadoutModes = ("Normal", "Fast")
+
+    def __init__(self, latency=0., size=(1024, 1024), readout_time=0.5, fast_factor=0.25, max_adu=65535,
+                 nested=False):
+        SimDevice.__init__(self, latency)
+        width, height = size
+        self.__dict__.update(CameraXSize=width, CameraYSize=height, MaxADU=max_adu, BinX=1, BinY=1, StartX=0,
+                             StartY=0, NumX=width, NumY=height, ReadoutMode=0, CCDTemperature=20.,
+                             SetCCDTemperature=-20., CoolerOn=False, LastExposureStartTime="",
+                             _readout_time=readout_time, _fast_factor=fast_factor, _nested=nested,
+                             _exposure=None, _image=None, _stopped=False)
+        self.__dict__["_frame"] = np.random.randint(0, max_adu + 1, (height, width)).astype(np.int32)
+
+    @property
+    def CoolerPower(self):
+        return 50. if self.CoolerOn else 0.
+
+    @property
+    def CameraState(self):
+        """
+        0 idle, 2 exposing, 3 reading.
+        """
+        if self._exposure is None or self._image is not None or self._stopped:
+            return 0
+        start, duration, readout = self._exposure
+        return 2 if time.time() < start + duration else 3
+
+    @property
+    def ImageReady(self):
+        if self._exposure is None or self._stopped:
+            return False
+        start, duration, readout = self._exposure
+        return time.time() >= start + duration + readout
+
+    @property
+    def PercentCompleted(self):
+        if self._exposure is None:
+            return 0
+        start, duration, readout = self._exposure
+        return min(100, int(100 * (time.time() - start) / (duration + readout)))
+
+    @property
+    def ImageArray(self):
+        if not self.ImageReady:
+            raise ValueError("No image ready.")
+        if self._image is None:
+            x, y, bx, by = self.StartX * self.BinX, self.StartY * self.BinY, self.BinX, self.BinY
+            image = self._frame[y:y + self.NumY * by:by, x:x + self.NumX * bx:bx].T  # ASCOM images are [x][y]
+            self.__dict__["_image"] = tuple(map(tuple, image.tolist())) if self._nested else image
+        return self._image
+
+    ImageArrayVariant = ImageArray
+
+    def StartExposure(self, duration, light):
+        if self.NumX * self.BinX + self.StartX * self.BinX > self.CameraXSize or \
+                self.NumY * self.BinY + self.StartY * self.BinY > self.CameraYSize:
+            raise ValueError("Subframe outside of the sensor.")
+        readout = self._readout_time * self.NumX * self.NumY / float(self.CameraXSize * self.CameraYSize)
+        if self.ReadoutModes[self.ReadoutMode] == "Fast":
+            readout *= self._fast_factor
+        self.__dict__.update(_exposure=(time.time(), duration, readout), _image=None, _stopped=False,
+                             LastExposureStartTime=time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime()))
+
+    def StopExposure(self):
+        if self._exposure is not None:
+            start, duration, readout = self._exposure
+            self.__dict__["_exposure"] = (start, min(duration, time.time() - start), readout)
+
+    def AbortExposure(self):
+        self.__dict__["_stopped"] = True
+
+
+class SimFocuser(SimDevice):
+    """
+    Absolute focuser moving ``speed`` steps per second.
+    """
+
+    Description = "Simulated focuser"
+    Absolute = True
+    TempCompAvailable = False
+    TempComp = False
+    Temperature = 10.
+
+    def __init__(self, latency=0., max_step=50000, speed=1000., position=25000):
+        SimDevice.__init__(self, latency)
+        self.__dict__.update(MaxStep=max_step, MaxIncrement=max_step, _speed=speed,
+                             _motion=Motion(position, position, 0.))
+
+    @property
+    def Link(self):
+        return self.Connected
+
+    @Link.setter
+    def Link(self, value):
+        self.Connected = value
+
+    @property
+    def Position(self):
+        return int(round(self._motion.value()))
+
+    @property
+    def IsMoving(self):
+        return self._motion.moving()
+
+    def Move(self, position):
+        if not 0 <= position <= self.MaxStep:
+            raise ValueError("Position %d outside of 0-%d." % (position, self.MaxStep))
+        start = self._motion.value()
+        self.__dict__["_motion"] = Motion(start, position, abs(position - start) / self._speed)
+
+    def Halt(self):
+        self._motion.stop()
+
+
+class SimFilterWheel(SimDevice):
+    """
+    Filter wheel taking ``slot_time`` seconds per slot, the shortest way round. Position is -1 while moving.
+    """
+
+    Description = "Simulated filter wheel"
+
+    def __init__(self, latency=0., names=("U", "B", "V", "R", "I"), slot_time=0.5):
+        SimDevice.__init__(self, latency)
+        self.__dict__.update(Names=list(names), FocusOffsets=[0] * len(names), _slot_time=slot_time,
+                             _motion=Motion(0, 0, 0.))
+
+    @property
+    def Position(self):
+        return -1 if self._motion.moving() else self._motion.target
+
+    @Position.setter
+    def Position(self, position):
+        if not 0 <= position < len(self.Names):
+            raise ValueError("Invalid filter position %d." % position)
+        current = self._motion.target
+        slots = min(abs(position - current), len(self.Names) - abs(position - current))
+        self.__dict__["_motion"] = Motion(current, position, slots * self._slot_time)
+
+
+#: device factories of the "sim" transport, replace them to configure the created devices.
+factories = {"telescope": SimTelescope,
+             "camera": SimCamera,
+             "focuser": SimFocuser,
+             "filterwheel": SimFilterWheel}
+
+
+def create(device_type):
+    """
+    Returns a new simulated device of ``device_type``, used by the "sim" transport in place of ``Dispatch``.
+    """
+    return factories[device_type]()
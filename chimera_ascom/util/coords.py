@@ -0,0 +1,55 @@
+import time
+
+import numpy as np
+
+J2000 = 2451545.0
+
+
+def angular_distance(lon1, lat1, lon2, lat2):
+    """
+    Returns the angular distance, in degrees, between two points of the sphere given in degrees (RA/Dec with RA in
+    degrees, or Az/Alt). Works on scalars and numpy arrays.
+    """
+    lon1, lat1, lon2, lat2 = [np.radians(v) for v in (lon1, lat1, lon2, lat2)]
+    # haversine, accurate for small distances too
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return np.degrees(2 * np.arcsin(np.minimum(1., np.sqrt(a))))
+
+
+def julian_date(timestamp=None):
+    """
+    Returns the Julian date of a unix ``timestamp``, default now.
+    """
+    return (time.time() if timestamp is None else timestamp) / 86400. + 2440587.5
+
+
+def precess_j2000(ra, dec, jd):
+    """
+    Precesses J2000 coordinates (degrees, scalars or arrays) to the equinox of ``jd`` with the IAU 1976 angles.
+
+    :return: (ra, dec) in degrees, ra in [0, 360).
+    """
+    t = (jd - J2000) / 36525.
+    zeta = np.radians((2306.2181 * t + 0.30188 * t ** 2 + 0.017998 * t ** 3) / 3600.)
+    z = np.radians((2306.2181 * t + 1.09468 * t ** 2 + 0.018203 * t ** 3) / 3600.)
+    theta = np.radians((2004.3109 * t - 0.42665 * t ** 2 - 0.041833 * t ** 3) / 3600.)
+
+    ra, dec = np.radians(ra) + zeta, np.radians(dec)
+    a = np.cos(dec) * np.sin(ra)
+    b = np.cos(theta) * np.cos(dec) * np.cos(ra) - np.sin(theta) * np.sin(dec)
+    c = np.sin(theta) * np.cos(dec) * np.cos(ra) + np.cos(theta) * np.sin(dec)
+    return np.degrees(np.arctan2(a, b) + z) % 360., np.degrees(np.arcsin(np.clip(c, -1., 1.)))
+
+
+def horizontal(ra, dec, sidereal_time, latitude):
+    """
+    Hour angle and horizontal coordinates of apparent ``ra``, ``dec`` (degrees, scalars or arrays).
+
+    :param sidereal_time: local sidereal time, hours.
+    :return: (hour angle in hours within [-12, 12), altitude, azimuth from north through east in degrees).
+    """
+    ha = (sidereal_time * 15. - ra + 180.) % 360. - 180.
+    h, d, lat = np.radians(ha), np.radians(dec), np.radians(latitude)
+    alt = np.arcsin(np.clip(np.sin(d) * np.sin(lat) + np.cos(d) * np.cos(lat) * np.cos(h), -1., 1.))
+    az = np.arctan2(-np.cos(d) * np.sin(h), np.sin(d) * np.cos(lat) - np.cos(d) * np.sin(lat) * np.cos(h))
+    return ha / 15., np.degrees(alt), np.degrees(az) % 360.
@@ -0,0 +1,262 @@
+import time
+import types
+import logging
+import threading
+import itertools
+import Queue
+
+from chimera_ascom.util.metrics import CallMetrics
+from chimera_ascom.util.transport import initialize_thread, DriverTimeout
+
+log = logging.getLogger(__name__)
+
+# request priorities, lower first
+ABORT, COMMAND, READ, TELEMETRY = range(4)
+
+#: driver methods that stop the device, run ahead of everything else.
+ABORT_METHODS = frozenset(["AbortSlew", "StopExposure", "AbortExposure", "Halt"])
+
+
+class _Request(object):
+    __slots__ = ("func", "priority", "member", "queued", "started", "done", "result", "error")
+
+    def __init__(self, func, priority, member):
+        self.func = func
+        self.priority = priority
+        self.member = member
+        self.queued = time.time()
+        self.started = None
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class DriverThread(object):
+    """
+    Owns a driver object and runs every call to it on a single thread, taking requests from a priority queue: abort
+    and stop commands first, then other commands and writes, then reads and finally telemetry reads. Identical reads
+    waiting in the queue are merged into a single driver call. Calls to driver members are timed into ``metrics``.
+
+    Consecutive failed calls are counted in ``errors_in_row`` and reported to ``on_error``, a callable(error) run on
+    the driver thread, so a ConnectionSupervisor can check the link. ``busy()`` tells whether a call is running.
+
+    :param timeout: default seconds a caller waits for its request.
+    """
+
+    def __init__(self, name, timeout=60):
+        self.metrics = CallMetrics(name)
+        self.name = name
+        self.timeout = timeout
+        self.driver = None
+        self.methods = set()
+        self.errors_in_row = 0
+        self.on_error = None
+        self._queue = Queue.PriorityQueue()
+        self._sequence = itertools.count()
+        self._pending = {}
+        self._current = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = dict((p, {"requests": 0, "merged": 0, "wait_total": 0., "wait_max": 0.})
+                           for p in (ABORT, COMMAND, READ, TELEMETRY))
+        self._max_depth = 0
+
+    @property
+    def name(self):
+        return self.metrics.device
+
+    @name.setter
+    def name(self, name):
+        self.metrics.device = name
+
+    def open(self, factory):
+        """
+        Creates the driver calling ``factory()`` on the driver thread, replacing the previous one.
+
+        :return: DriverProxy to the driver.
+        """
+        def create():
+            self.driver = factory()
+            self.methods.clear()
+        self.call(create, COMMAND)
+        return self.proxy()
+
+    def proxy(self, priority=READ):
+        """
+        :param priority: priority of property reads done through the proxy.
+        """
+        return DriverProxy(self, priority)
+
+    def call(self, func, priority=COMMAND, timeout=None, key=None, member=None):
+        """
+        Runs ``func()`` on the driver thread and returns its result.
+
+        :param key: requests with the same key waiting in the queue are run only once.
+        :param member: driver member called by ``func``, for the metrics.
+        :raises DriverTimeout: if the request is not done after ``timeout`` seconds.
+        """
+        self._start()
+        with self._lock:
+            request = self._pending.get(key) if key is not None else None
+            if request is not None:
+                self._stats[priority]["merged"] += 1
+            else:
+                request = _Request(func, priority, member)
+                if key is not None:
+                    self._pending[key] = request
+                self._queue.put((priority, next(self._sequence), key, request))
+                self._max_depth = max(self._max_depth, self._queue.qsize())
+
+        timeout = self.timeout if timeout is None else timeout
+        if not request.done.wait(timeout):
+            raise DriverTimeout("%s: driver call not done after %.1f s." % (self.name, timeout))
+        if request.error is not None:
+            raise request.error
+        return request.result
+
+    def busy(self):
+        """
+        :return: (driver member, seconds running) of the call running on the driver thread, None when idle.
+        """
+        current = self._current
+        if current is None:
+            return None
+        return current.member, time.time() - current.started
+
+    def interrupt(self, func, member=None):
+        """
+        Runs a stop command ``func()``: ahead of the queue when the driver thread is idle, right away on the calling
+        thread when a call (a synchronous slew, say) holds the driver thread. COM drivers live in the multithreaded
+        apartment and Alpaca calls are HTTP requests, both can be called from any thread.
+        """
+        if self.busy() is None:
+            return self.call(func, ABORT, member=member)
+        initialize_thread()
+        t0 = time.time()
+        failed = True
+        try:
+            result = func()
+            failed = False
+            return result
+        finally:
+            if member is not None:
+                self.metrics.record(member, time.time() - t0, failed)
+
+    def stop(self):
+        """
+        Stops the driver thread after its current call, the requests still waiting fail at once.
+        """
+        if self._thread is not None:
+            with self._lock:
+                self._pending.clear()
+            self._fail(self._queue, "driver thread stopped")
+            self._queue.put((-1, next(self._sequence), None, None))
+            self._thread.join(self.timeout)
+            self._thread = None
+
+    def reset(self):
+        """
+        Abandons the driver thread, which may be stuck in a driver call, and fails the requests waiting for it. The
+        next call starts a new thread. The abandoned thread exits after its current call.
+        """
+        with self._lock:
+            queue, self._queue = self._queue, Queue.PriorityQueue()
+            self._pending.clear()
+            self._current = None
+            self._thread = None
+            self.driver = None
+            self.errors_in_row = 0
+        self._fail(queue, "driver thread reset")
+        queue.put((-1, next(self._sequence), None, None))
+
+    def _fail(self, queue, reason):
+        while True:
+            try:
+                priority, sequence, key, request = queue.get_nowait()
+            except Queue.Empty:
+                break
+            if request is not None:
+                request.error = DriverTimeout("%s: %s." % (self.name, reason))
+                request.done.set()
+
+    def stats(self):
+        """
+        :return: queue depth (current and maximum) and requests, merged reads and wait times per priority.
+        """
+        with self._lock:
+            priorities = {}
+            for priority, name in ((ABORT, "abort"), (COMMAND, "command"), (READ, "read"), (TELEMETRY, "telemetry")):
+                stats = dict(self._stats[priority])
+                stats["wait_mean"] = stats.pop("wait_total") / stats["requests"] if stats["requests"] else 0.
+                priorities[name] = stats
+            return {"queue_depth": self._queue.qsize(), "max_queue_depth": self._max_depth, "priorities": priorities}
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, args=(self._queue,), name="Driver %s" % self.name)
+                self._thread.daemon = True
+                self._thread.start()
+
+    def _run(self, queue):
+        initialize_thread()
+        while True:
+            priority, sequence, key, request = queue.get()
+            if request is None:
+                return
+            with self._lock:
+                if key is not None:
+                    self._pending.pop(key, None)
+                wait = time.time() - request.queued
+                stats = self._stats[request.priority]
+                stats["requests"] += 1
+                stats["wait_total"] += wait
+                stats["wait_max"] = max(stats["wait_max"], wait)
+                request.started = time.time()
+                if queue is self._queue:  # not an abandoned thread
+                    self._current = request
+            t0 = request.started
+            try:
+                request.result = request.func()
+            except Exception, e:
+                request.error = e
+            with self._lock:
+                if self._current is request:
+                    self._current = None
+            if request.member is not None:
+                self.metrics.record(request.member, time.time() - t0, request.error is not None)
+            request.done.set()
+            if request.error is None:
+                self.errors_in_row = 0
+            else:
+                self.errors_in_row += 1
+                if self.on_error is not None:
+                    self.on_error(request.error)
+
+
+class DriverProxy(object):
+    """
+    Driver interface (properties as attributes, methods as methods) run on a DriverThread.
+    """
+
+    def __init__(self, thread, priority=READ):
+        self.__dict__.update(_thread=thread, _priority=priority)
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        thread = self._thread
+        if name in ABORT_METHODS:  # not looked up, that would wait behind a busy driver thread
+            return lambda *args: thread.interrupt(lambda: getattr(thread.driver, name)(*args), member=name)
+        if name not in thread.methods:
+            value = thread.call(lambda: getattr(thread.driver, name), self._priority, key=("get", name, self._priority),
+                                member=name)
+            if not isinstance(value, (types.MethodType, types.FunctionType, types.BuiltinMethodType)):
+                return value
+            thread.methods.add(name)  # known methods are called without looking them up first
+
+        return lambda *args: thread.call(lambda: getattr(thread.driver, name)(*args), COMMAND, member=name)
+
+    def __setattr__(self, name, value):
+        thread = self._thread
+        thread.call(lambda: setattr(thread.driver, name, value), COMMAND, member=name)
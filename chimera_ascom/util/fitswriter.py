@@ -0,0 +1,99 @@
+import os
+import logging
+
+import numpy as np
+
+try:
+    from astropy.io import fits
+except ImportError:
+    import pyfits as fits
+
+log = logging.getLogger(__name__)
+
+#: BITPIX of each numpy type FITS stores directly, unsigned types are stored signed with an offset (BZERO).
+BITPIX = {"u1": 8, "i2": 16, "u2": 16, "i4": 32, "u4": 32, "i8": 64, "f4": -32, "f8": -64}
+
+# header keywords written by the writer itself
+STRUCTURAL = ("SIMPLE", "BITPIX", "NAXIS", "NAXIS1", "NAXIS2", "EXTEND", "BZERO", "BSCALE")
+
+COMPRESSION = {"rice": "RICE_1", "gzip": "GZIP_1", "hcompress": "HCOMPRESS_1"}
+
+BLOCK = 2880
+
+
+def image_header(data, cards=()):
+    """
+    Returns the primary header of a 2D ``data`` image with ``cards`` ((key, value, comment) tuples) appended.
+    """
+    kind = "%s%d" % (data.dtype.kind, data.dtype.itemsize)
+    if kind not in BITPIX:
+        raise ValueError("FITS can't store %s images." % data.dtype)
+    header = fits.Header()
+    header["SIMPLE"] = True
+    header["BITPIX"] = BITPIX[kind]
+    header["NAXIS"] = 2
+    header["NAXIS1"] = data.shape[1]
+    header["NAXIS2"] = data.shape[0]
+    if data.dtype.kind == "u" and data.dtype.itemsize > 1:
+        header["BZERO"] = 1 << (8 * data.dtype.itemsize - 1)
+        header["BSCALE"] = 1
+    _append(header, cards)
+    return header
+
+
+def _append(header, cards):
+    for card in cards:
+        if card[0].upper() in STRUCTURAL:
+            continue
+        header.append(tuple(card))
+
+
+def _to_fits(chunk):
+    """
+    Converts rows of an image to FITS big endian storage. Unsigned values are shifted by BZERO flipping their sign
+    bit, which is value - BZERO reinterpreted as signed, without a wider intermediate array.
+    """
+    if chunk.dtype.kind == "u" and chunk.dtype.itemsize > 1:
+        sign = np.array(1 << (8 * chunk.dtype.itemsize - 1), dtype=chunk.dtype)
+        chunk = np.bitwise_xor(chunk, sign).view("i%d" % chunk.dtype.itemsize)
+    return chunk.astype(chunk.dtype.newbyteorder(">"))
+
+
+def write_fits(path, data, cards=(), compression=None, tile_rows=16, chunk_rows=256):
+    """
+    Writes the 2D image ``data`` to ``path``.
+
+    Uncompressed images are streamed ``chunk_rows`` rows at a time, so only one chunk is ever byteswapped in memory
+    instead of a whole copy of the frame. With ``compression`` (rice, gzip or hcompress) the image is tile compressed
+    losslessly, each tile being ``tile_rows`` full rows.
+
+    The file is written under a temporary name and renamed when complete, readers never see partial files.
+
+    :return: ``path``.
+    """
+    partial = path + ".part"
+    if compression:
+        _write_compressed(partial, data, cards, COMPRESSION[compression.lower()], tile_rows)
+    else:
+        header = image_header(data, cards)
+        with open(partial, "wb") as f:
+            f.write(header.tostring())
+            for row in range(0, data.shape[0], chunk_rows):
+                _to_fits(data[row:row + chunk_rows]).tofile(f)
+            size = data.size * data.dtype.itemsize
+            f.write("\0" * (-size % BLOCK))
+    os.rename(partial, path)
+    return path
+
+
+def _write_compressed(path, data, cards, compression_type, tile_rows):
+    header = fits.Header()
+    _append(header, cards)
+    rows = min(tile_rows, data.shape[0])
+    try:
+        hdu = fits.CompImageHDU(data, header=header, compression_type=compression_type,
+                                tile_shape=(rows, data.shape[1]))
+    except TypeError:  # astropy < 5.3 and pyfits take the tile size in FITS axis order
+        hdu = fits.CompImageHDU(data, header=header, compression_type=compression_type,
+                                tile_size=(data.shape[1], rows))
+    hdu.writeto(path)
@@ -0,0 +1,53 @@
+import math
+
+import numpy as np
+
+
+class FocusFitError(Exception):
+    pass
+
+
+def fit_hyperbola(positions, fwhm):
+    """
+    Fits FWHM(x) = a sqrt(1 + ((x - c) / b)^2), the star size of a defocused optical system. Its square is a
+    parabola in x, so the fit is a linear least squares of FWHM^2.
+
+    :return: (best position c, FWHM at c).
+    :raises FocusFitError: with less than 3 samples or a curve that doesn't open upwards.
+    """
+    x = np.asarray(positions, dtype=float)
+    y = np.asarray(fwhm, dtype=float)
+    if len(x) < 3:
+        raise FocusFitError("Need 3 samples to fit a hyperbola, got %d." % len(x))
+    # centered and scaled: positions are often tens of thousands of steps, only a few hundred apart
+    center, scale = x.mean(), np.ptp(x) or 1.
+    a, b, c = np.polyfit((x - center) / scale, y ** 2, 2)
+    if a <= 0:
+        raise FocusFitError("Focus curve has no minimum.")
+    return center - scale * b / (2 * a), math.sqrt(max(c - b ** 2 / (4 * a), 0.))
+
+
+def fit_vcurve(positions, fwhm):
+    """
+    Fits a line to each side of the smallest sample (including it) and returns their intersection, the V-curve
+    method: far from focus the star size grows linearly with the defocus.
+
+    :return: (best position, FWHM there).
+    :raises FocusFitError: with less than 2 samples on a side or lines that don't make a V.
+    """
+    x = np.asarray(positions, dtype=float)
+    y = np.asarray(fwhm, dtype=float)
+    order = np.argsort(x)
+    x, y = x[order], y[order]
+    i = int(np.argmin(y))
+    if i < 1 or i > len(x) - 2:
+        raise FocusFitError("Minimum of the focus curve at the edge of the samples.")
+    left_slope, left_zero = np.polyfit(x[:i + 1], y[:i + 1], 1)
+    right_slope, right_zero = np.polyfit(x[i:], y[i:], 1)
+    if left_slope >= 0 or right_slope <= 0:
+        raise FocusFitError("Focus curve is not a V.")
+    best = (right_zero - left_zero) / (left_slope - right_slope)
+    return best, left_slope * best + left_zero
+
+
+FITS = {"hyperbola": fit_hyperbola, "vcurve": fit_vcurve}
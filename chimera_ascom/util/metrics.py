@@ -0,0 +1,121 @@
+import os
+import time
+import bisect
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+#: upper bounds, in seconds, of the latency histogram buckets.
+BUCKETS = (0.001, 0.002, 0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1., 2., 5., 10., float("inf"))
+
+
+class _Member(object):
+    __slots__ = ("calls", "errors", "total", "max", "histogram")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.total = 0.
+        self.max = 0.
+        self.histogram = [0] * len(BUCKETS)
+
+
+class CallMetrics(object):
+    """
+    Call counts, error counts and latency histograms of the calls to a device, per ASCOM member. Recording a call
+    costs a dictionary lookup and a few additions, so it stays on during the night.
+
+    :param device: device name used in logs and exports.
+    :param slow_threshold: calls slower than this, in seconds, are logged as warnings. 0 disables.
+    """
+
+    def __init__(self, device, slow_threshold=0):
+        self.device = device
+        self.slow_threshold = slow_threshold
+        self.started = time.time()
+        self._members = {}
+        self._lock = threading.Lock()
+        self._exporter = None
+
+    def record(self, member, seconds, error=False):
+        with self._lock:
+            stats = self._members.get(member)
+            if stats is None:
+                stats = self._members[member] = _Member()
+            stats.calls += 1
+            stats.errors += error
+            stats.total += seconds
+            if seconds > stats.max:
+                stats.max = seconds
+            stats.histogram[bisect.bisect_left(BUCKETS, seconds)] += 1
+        if self.slow_threshold and seconds > self.slow_threshold:
+            log.warning("%s: slow driver call %s took %.3f s%s." % (self.device, member, seconds,
+                                                                    " and failed" if error else ""))
+
+    def stats(self):
+        """
+        :return: {member: {"calls", "errors", "total", "mean", "max", "histogram": [(bucket upper bound, calls)]}}.
+        """
+        with self._lock:
+            return dict((member, {"calls": s.calls, "errors": s.errors, "total": s.total,
+                                  "mean": s.total / s.calls if s.calls else 0., "max": s.max,
+                                  "histogram": zip(BUCKETS, s.histogram)})
+                        for member, s in self._members.iteritems())
+
+    def reset(self):
+        with self._lock:
+            self._members.clear()
+            self.started = time.time()
+
+    def text(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for member, stats in sorted(self.stats().iteritems()):
+            labels = 'device="%s",member="%s"' % (self.device, member)
+            lines.append("ascom_driver_calls_total{%s} %d" % (labels, stats["calls"]))
+            lines.append("ascom_driver_errors_total{%s} %d" % (labels, stats["errors"]))
+            count = 0
+            for bound, calls in stats["histogram"]:
+                count += calls
+                lines.append('ascom_driver_call_seconds_bucket{%s,le="%s"} %d' %
+                             (labels, "+Inf" if bound == float("inf") else bound, count))
+            lines.append("ascom_driver_call_seconds_sum{%s} %f" % (labels, stats["total"]))
+            lines.append("ascom_driver_call_seconds_count{%s} %d" % (labels, stats["calls"]))
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        path = os.path.expanduser(path)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(self.text())
+        if os.path.exists(path):  # os.rename doesn't replace files on Windows
+            os.remove(path)
+        os.rename(tmp, path)
+
+    def start_export(self, path, interval=60):
+        """
+        Writes the metrics to ``path`` every ``interval`` seconds, on a background thread.
+        """
+        stop = threading.Event()
+
+        def run():
+            while not stop.wait(interval):
+                try:
+                    self.write(path)
+                except EnvironmentError, e:
+                    log.warning("Could not write metrics to %s: %s" % (path, e))
+
+        self.stop_export()
+        self._exporter = (stop, threading.Thread(target=run, name="%s metrics" % self.device))
+        self._exporter[1].daemon = True
+        self._exporter[1].start()
+
+    def stop_export(self):
+        if self._exporter is not None:
+            stop, thread = self._exporter
+            stop.set()
+            thread.join()
+            self._exporter = None
@@ -0,0 +1,119 @@
+import time
+import threading
+import logging
+
+from chimera_ascom.util.transport import initialize_thread
+
+log = logging.getLogger(__name__)
+
+
+class OperationTimeout(Exception):
+    pass
+
+
+class Operation(object):
+    """
+    Handle of a device operation (a move, a slew, a filter change) that completes in the background.
+
+    :param name: description used in logs and errors.
+    :param cancel: optional callable that aborts the operation on the device.
+    """
+
+    def __init__(self, name, cancel=None):
+        self.name = name
+        self.started = time.time()
+        self.finished = None
+        self.result = None
+        self.error = None
+        self._cancel = cancel
+        self._done = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    def run(self, func, *args):
+        """
+        Runs ``func(*args)`` on a new thread and finishes the operation with its result.
+        """
+        def target():
+            initialize_thread()
+            try:
+                self.finish(func(*args))
+            except Exception, e:
+                log.exception("%s failed" % self.name)
+                self.finish(error=e)
+
+        thread = threading.Thread(target=target, name=self.name)
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def finish(self, result=None, error=None):
+        with self._lock:
+            self.result = result
+            self.error = error
+            self.finished = time.time()
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+    def done(self):
+        return self._done.isSet()
+
+    def wait(self, timeout=None):
+        """
+        Waits for the operation and returns its result.
+
+        :raises OperationTimeout: if it is not done after ``timeout`` seconds.
+        """
+        if not self._done.wait(timeout):
+            raise OperationTimeout("%s not done after %.1f s." % (self.name, timeout))
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def cancel(self):
+        if self._cancel is not None and not self.done():
+            self._cancel()
+
+    def add_done_callback(self, callback):
+        with self._lock:
+            if not self._done.isSet():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.time()) - self.started
+
+    def __repr__(self):
+        return "<Operation %s %s>" % (self.name, "done" if self.done() else "running")
+
+
+def poll(done, timeout=None, abort=None, expected=None, min_interval=0.01, max_interval=0.5):
+    """
+    Calls ``done()`` until it returns True, with adaptive sleeps: they grow geometrically from ``min_interval`` to
+    ``max_interval`` and, if the ``expected`` duration is known, the driver is left alone until close to it.
+
+    :param abort: optional threading.Event, sleeps are interrupted when it is set.
+    :return: True when done, False if aborted.
+    :raises OperationTimeout: after ``timeout`` seconds.
+    """
+    t0 = time.time()
+    interval = min_interval
+    while not done():
+        elapsed = time.time() - t0
+        if timeout is not None and elapsed > timeout:
+            raise OperationTimeout("Not done after %.1f s." % timeout)
+        if expected is not None and expected - elapsed > 2 * interval:
+            wait = min(expected - elapsed - interval, max_interval)
+        else:
+            wait = interval
+            interval = min(interval * 1.5, max_interval)
+        if abort is not None:
+            if abort.wait(wait) or abort.isSet():
+                return False
+        else:
+            time.sleep(wait)
+    return True
@@ -0,0 +1,148 @@
+import os
+import mmap
+import uuid
+import logging
+import tempfile
+import threading
+import multiprocessing
+import Queue
+
+import numpy as np
+
+from chimera_ascom.util.fitswriter import write_fits
+
+log = logging.getLogger(__name__)
+
+
+class SharedSegment(object):
+    """
+    Named shared memory: a pagefile backed mapping on Windows, a file on /dev/shm (or the temporary directory)
+    elsewhere. The creator owns it and removes it on ``close``.
+    """
+
+    def __init__(self, name, size, create=False):
+        self.name = name
+        self.size = size
+        self._owner = create
+        self._path = None
+        if os.name == "nt":
+            self.buffer = mmap.mmap(-1, size, tagname=name)
+        else:
+            directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+            self._path = os.path.join(directory, name)
+            with open(self._path, "w+b" if create else "r+b") as f:
+                if create:
+                    f.truncate(size)
+                self.buffer = mmap.mmap(f.fileno(), size)
+
+    def array(self, offset, shape, dtype):
+        """
+        :return: numpy view of the segment, no copy.
+        """
+        return np.frombuffer(self.buffer, dtype=dtype, count=int(np.prod(shape)), offset=offset).reshape(shape)
+
+    def close(self):
+        self.buffer.close()
+        if self._owner and self._path is not None and os.path.exists(self._path):
+            os.remove(self._path)
+
+
+def _worker(name, size, jobs, results):
+    segment = SharedSegment(name, size)
+    try:
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            number, offset, shape, dtype, path, cards, compression, tile_rows = job
+            try:
+                write_fits(path, segment.array(offset, shape, dtype), cards, compression, tile_rows)
+                results.put((number, None))
+            except Exception, e:
+                results.put((number, "%s: %s" % (e.__class__.__name__, e)))
+    finally:
+        segment.close()
+
+
+class ProcessWriter(object):
+    """
+    Writes FITS files on ``processes`` worker processes, so that byteswapping, compression and disk writes don't hold
+    the GIL of the manager. Frames are copied once into one of ``slots`` slots of ``frame_bytes`` bytes of a shared
+    memory segment, the workers read them from there: pixels are never pickled.
+
+    ``write`` is called from any thread and blocks until its file is written, waiting for a free slot first.
+    """
+
+    def __init__(self, name, frame_bytes, slots=2, processes=1):
+        self.name = name
+        self.frame_bytes = frame_bytes
+        self._segment = SharedSegment("chimera-%s-%s" % (os.getpid(), uuid.uuid4().hex[:8]), frame_bytes * slots,
+                                      create=True)
+        self._free = Queue.Queue()
+        for slot in range(slots):
+            self._free.put(slot)
+        self._jobs = multiprocessing.Queue()
+        self._results = multiprocessing.Queue()
+        self._waiting = {}
+        self._lock = threading.Lock()
+        self._number = 0
+        self._processes = [multiprocessing.Process(target=_worker, name="%s writer %d" % (name, i),
+                                                   args=(self._segment.name, self._segment.size, self._jobs,
+                                                         self._results))
+                           for i in range(processes)]
+        for process in self._processes:
+            process.daemon = True
+            process.start()
+        self._listener = threading.Thread(target=self._listen, name="%s writer results" % name)
+        self._listener.daemon = True
+        self._listener.start()
+
+    def write(self, path, data, cards=(), compression=None, tile_rows=16):
+        """
+        Same as fitswriter.write_fits, on a worker process.
+        """
+        if data.nbytes > self.frame_bytes:
+            raise ValueError("%d bytes frame larger than the %d bytes slots." % (data.nbytes, self.frame_bytes))
+        slot = self._free.get()
+        try:
+            offset = slot * self.frame_bytes
+            self._segment.array(offset, data.shape, data.dtype)[...] = data
+            done = threading.Event()
+            with self._lock:
+                self._number += 1
+                number = self._number
+                self._waiting[number] = [done, None]
+            self._jobs.put((number, offset, data.shape, data.dtype.str, path, list(cards), compression, tile_rows))
+            while not done.wait(1.):
+                if not any(process.is_alive() for process in self._processes):
+                    with self._lock:
+                        self._waiting[number][1] = "writer processes died"
+                    break
+            with self._lock:
+                error = self._waiting.pop(number)[1]
+        finally:
+            self._free.put(slot)
+        if error is not None:
+            raise IOError("Could not write %s: %s" % (path, error))
+        return path
+
+    def close(self):
+        for process in self._processes:
+            self._jobs.put(None)
+        for process in self._processes:
+            process.join()
+        self._results.put(None)
+        self._listener.join()
+        self._segment.close()
+
+    def _listen(self):
+        while True:
+            result = self._results.get()
+            if result is None:
+                return
+            number, error = result
+            with self._lock:
+                waiting = self._waiting.get(number)
+                if waiting is not None:
+                    waiting[1] = error
+                    waiting[0].set()
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import logging
+import threading
+
+from chimera_ascom.util.transport import device_name, DRIVER_ERRORS, LINK_ERRORS
+
+log = logging.getLogger(__name__)
+
+_file_lock = threading.Lock()
+
+# value of the members a driver fails to read
+_MISSING = object()
+
+
+class CapabilityProfile(object):
+    """
+    Capability properties of a device (sizes, limits, supported features) kept in a JSON file, keyed by device id
+    and driver version, so that restarts don't read them again from slow drivers.
+
+    Members are read through ``read``: from the file when known (warm start), from the driver otherwise (cold start).
+    ``verify`` reads them all again from the driver, to be run in background once the instrument is up: changes are
+    saved for the next start, the running instrument keeps the values it started with.
+
+    :param path: JSON file shared by every device.
+    :param device: device id (e.g. the ASCOM id).
+    :param version: driver version, a new version starts a new profile.
+    """
+
+    def __init__(self, path, device, version):
+        self.path = os.path.expanduser(path)
+        self.key = "%s@%s" % (device, version)
+        self.driver_reads = 0
+        self._values = {}
+        self._missing = set()
+        self._changed = False
+        self._lock = threading.Lock()
+        self._load()
+        self.warm = bool(self._values or self._missing)
+
+    def read(self, driver, member):
+        """
+        Returns ``member`` from the profile, reading it from ``driver`` if unknown. Members the driver fails to read
+        (missing, PropertyNotImplemented or any other driver error) are recorded as missing.
+
+        :raises AttributeError: if the driver doesn't implement ``member``.
+        """
+        with self._lock:
+            if member in self._missing:
+                raise AttributeError("%s not implemented by %s" % (member, self.key))
+            if member in self._values:
+                return self._values[member]
+        value = self._fetch(driver, member)
+        with self._lock:
+            if _set(self._values, self._missing, member, value):
+                self._changed = True
+        return self.read(driver, member)
+
+    def verify(self, driver):
+        """
+        Reads every known member again from ``driver`` and saves the profile if anything changed.
+
+        :return: list of the members that changed.
+        """
+        with self._lock:
+            values, missing = dict(self._values), set(self._missing)
+        checked_values, checked_missing = {}, set()
+        members = sorted(set(values) | missing)
+        for member in members:
+            _set(checked_values, checked_missing, member, self._fetch(driver, member))
+        changed = [m for m in members if checked_values.get(m, _MISSING) != values.get(m, _MISSING)]
+        if changed:
+            log.warning("%s capabilities changed (%s), they will be used on the next start." %
+                        (self.key, ", ".join(changed)))
+            self._write(checked_values, checked_missing)
+        return changed
+
+    def save(self):
+        with self._lock:
+            if not self._changed:
+                return
+            values, missing = dict(self._values), set(self._missing)
+            self._changed = False
+        self._write(values, missing)
+
+    def _write(self, values, missing):
+        with _file_lock:
+            profiles = self._read_file()
+            profiles[self.key] = {"values": values, "missing": sorted(missing), "updated": time.time()}
+            directory = os.path.dirname(self.path)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(profiles, f, indent=1, sort_keys=True)
+            if os.path.exists(self.path):  # os.rename doesn't replace files on Windows
+                os.remove(self.path)
+            os.rename(tmp, self.path)
+
+    def _fetch(self, driver, member):
+        """
+        :return: ``member`` read from ``driver``, _MISSING if the driver fails to read it.
+        """
+        self.driver_reads += 1
+        try:
+            return _plain(getattr(driver, member))
+        except (AttributeError,) + DRIVER_ERRORS, e:
+            if isinstance(e, LINK_ERRORS):  # timeouts and lost links say nothing about the driver
+                raise
+            log.debug("%s: %s not available: %s" % (self.key, member, e))
+            return _MISSING
+
+    def _load(self):
+        with _file_lock:
+            profile = self._read_file().get(self.key, {})
+        self._values = profile.get("values", {})
+        self._missing = set(profile.get("missing", []))
+
+    def _read_file(self):
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except ValueError:
+            log.warning("Ignoring corrupted capability profiles file %s." % self.path)
+            return {}
+
+
+def open_profile(instrument, driver, device_type):
+    """
+    Returns the CapabilityProfile of a chimera instrument, stored in its ``profile_file``.
+    """
+    try:
+        version = driver.DriverVersion
+    except (AttributeError,) + DRIVER_ERRORS:
+        version = "unknown"
+    return CapabilityProfile(instrument["profile_file"], device_name(instrument, device_type), version)
+
+
+def _plain(value):
+    # driver collections (e.g. COM ArrayLists) are stored as lists
+    if isinstance(value, (basestring, bool, int, long, float)) or value is None:
+        return value
+    return list(value)
+
+
+def _set(values, missing, member, value):
+    # stores a _fetch result, returns whether it changed the profile
+    if value is _MISSING:
+        if member in missing:
+            return False
+        values.pop(member, None)
+        missing.add(member)
+        return True
+    if member in values and values[member] == value:
+        return False
+    missing.discard(member)
+    values[member] = value
+    return True
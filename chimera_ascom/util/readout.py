@@ -0,0 +1,153 @@
+# Based on http://www.ascom-standards.org/Help/Developer/html/P_ASCOM_DriverAccess_Camera_ImageArray.htm
+
+import logging
+import tempfile
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def native_dtype(max_adu):
+    """
+    Returns the smallest numpy dtype that holds every value the camera ADC can produce: uint8, uint16 or uint32.
+
+    :param max_adu: ASCOM ``MaxADU`` of the camera, None if unknown (int32, the type of ASCOM ImageArray elements).
+    """
+    if max_adu is not None and max_adu > 0:
+        for dtype in (np.uint8, np.uint16, np.uint32):
+            if max_adu <= np.iinfo(dtype).max:
+                return np.dtype(dtype)
+    return np.dtype(np.int32)
+
+
+def allocate_frame(shape, dtype, directory=None):
+    """
+    Returns an uninitialized frame array, memory mapped on an anonymous temporary file of ``directory`` if given, so
+    that it stays out of the process heap. The file is only scratch storage, gone once the array is released: the
+    FITS file is written from it as from any other array.
+    """
+    if directory is None:
+        return np.empty(shape, dtype=dtype)
+    return np.memmap(tempfile.TemporaryFile(prefix="frame-", dir=directory), dtype=dtype, mode="w+", shape=shape)
+
+
+class ImageReader(object):
+    """
+    Copies the last ASCOM image into a C-contiguous (NumY, NumX) numpy array of the camera native dtype.
+
+    ASCOM publishes ``ImageArray`` indexed as [x][y], so every path below writes straight into the transposed
+    destination in a single pass, without building an intermediate int64 array or a transposed copy. The paths are,
+    from the fastest:
+
+    * raw: the driver returns an array or a buffer (numpy aware bridges, Alpaca ImageBytes). It is viewed without a
+      copy and cast into the destination.
+    * array: the driver returns nested sequences (pywin32 SAFEARRAY conversion). Each column is converted directly
+      into the destination.
+    * variant: same as above, read from ``ImageArrayVariant`` for drivers that don't implement ``ImageArray``.
+
+    The path that worked on the first frame is remembered and tried first afterwards.
+    """
+
+    #: element type of raw buffers without type information, ASCOM ImageArray elements are Int32.
+    raw_dtype = np.dtype('<i4')
+
+    def __init__(self, dtype=np.uint16):
+        self.dtype = np.dtype(dtype)
+        self.last_path = None
+        self._members = ['ImageArray', 'ImageArrayVariant']
+
+    def read(self, ascom, shape=None, out=None):
+        """
+        Reads the image from ``ascom``.
+
+        :param ascom: driver object.
+        :param shape: (NumX, NumY) of the image, only needed for raw buffers without shape information.
+        :param out: optional preallocated (NumY, NumX) destination array.
+        :return: the image as a (NumY, NumX) array.
+        """
+        error = None
+        for member in list(self._members):
+            try:
+                data = getattr(ascom, member)
+            except Exception, e:  # COM, Alpaca or missing member: try the next one.
+                log.debug("Could not read %s: %s" % (member, e))
+                error = e
+                continue
+
+            if member != self._members[0]:  # remember which member works for the next frames
+                self._members.remove(member)
+                self._members.insert(0, member)
+
+            return self._fill(data, shape, out, member)
+
+        raise error
+
+    def _fill(self, data, shape, out, member):
+        if isinstance(data, np.ndarray) or hasattr(data, '__array_interface__'):
+            self.last_path = 'raw'
+            src = np.asarray(data)
+        elif isinstance(data, (buffer, bytearray, memoryview, str)):
+            self.last_path = 'raw'
+            if shape is None:
+                raise ValueError("Image shape is needed to read raw %s buffers." % member)
+            src = np.frombuffer(data, dtype=self.raw_dtype).reshape(shape)
+        else:
+            self.last_path = 'array' if member == 'ImageArray' else 'variant'
+            width, height = len(data), len(data[0])
+            out = self._destination(out, width, height)
+            for x, column in enumerate(data):
+                out[:, x] = column
+            return out
+
+        if src.ndim == 3:  # color cameras (NumX, NumY, NumPlanes): keep the first plane.
+            src = src[:, :, 0]
+        out = self._destination(out, src.shape[0], src.shape[1])
+        out[...] = src.T
+        return out
+
+    def _destination(self, out, width, height):
+        if out is None:
+            return np.empty((height, width), dtype=self.dtype)
+        if out.shape != (height, width):
+            raise ValueError("Destination shape %s does not match image %dx%d." % (out.shape, width, height))
+        return out
+
+
+def binning_table(max_bin_x=1, max_bin_y=1, asymmetric=False):
+    """
+    Returns the binnings a camera supports as an ordered list of (name, BinX, BinY), named "XxY" as in chimera.
+
+    :param max_bin_x: ASCOM ``MaxBinX``.
+    :param max_bin_y: ASCOM ``MaxBinY``.
+    :param asymmetric: ASCOM ``CanAsymmetricBin``, otherwise only BinX == BinY is listed.
+    """
+    table = []
+    for bin_x in range(1, max(int(max_bin_x), 1) + 1):
+        for bin_y in range(1, max(int(max_bin_y), 1) + 1):
+            if asymmetric or bin_x == bin_y:
+                table.append(("%dx%d" % (bin_x, bin_y), bin_x, bin_y))
+    return table
+
+
+def readout_speeds(modes=None, can_fast_readout=False, fast_mode=None):
+    """
+    Returns the readout speeds of a camera as a list of {"name", "fast", "settings"}, where settings are the driver
+    properties that select the speed. ASCOM cameras either have ``ReadoutModes`` or a ``FastReadout`` switch.
+
+    :param modes: ASCOM ``ReadoutModes`` names, None if not implemented.
+    :param can_fast_readout: ASCOM ``CanFastReadout``.
+    :param fast_mode: name of the fast mode in ``modes``, by default the first one with "fast" in its name.
+    """
+    if can_fast_readout:
+        return [{"name": "normal", "fast": False, "settings": {"FastReadout": False}},
+                {"name": "fast", "fast": True, "settings": {"FastReadout": True}}]
+    if not modes:
+        return [{"name": "default", "fast": False, "settings": {}}]
+    if len(modes) == 1:  # nothing to select, don't write ReadoutMode on drivers that may not implement it
+        return [{"name": modes[0], "fast": False, "settings": {}}]
+
+    if fast_mode is None:
+        fast_mode = ([name for name in modes if "fast" in name.lower()] + [None])[0]
+    return [{"name": name, "fast": name == fast_mode, "settings": {"ReadoutMode": i}}
+            for i, name in enumerate(modes)]
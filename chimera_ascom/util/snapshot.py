@@ -0,0 +1,152 @@
+import time
+import threading
+from collections import defaultdict
+
+
+class _Failed(object):
+    # driver exception kept in a snapshot, raised again to whoever reads that member
+    def __init__(self, exception):
+        self.exception = exception
+
+
+class StateCache(object):
+    """
+    Serves driver properties from snapshots taken at most once every ``ttl`` seconds.
+
+    Related properties are declared in groups and read together, so that the getters of a group (e.g.
+    RightAscension and Declination) see the same snapshot and cost a single refresh. Members declared as static
+    (capabilities) are read once per connection. Other members are always read from the driver.
+
+    :param driver: callable returning the current driver object.
+    :param groups: sequence of tuples of members read together.
+    :param static: members read only once until ``invalidate(static=True)``.
+    :param ttl: snapshot validity in seconds.
+    """
+
+    def __init__(self, driver, groups=(), static=(), ttl=0.2):
+        self.driver = driver
+        self.ttl = ttl
+        self._group_of = dict((member, tuple(group)) for group in groups for member in group)
+        self._static_members = frozenset(static)
+        self._values = {}
+        self._times = {}
+        self._invalidated = {}
+        self._lock = threading.RLock()
+        self._hits = defaultdict(int)
+        self._misses = defaultdict(int)
+        self._reads = 0
+        self._t0 = time.time()
+
+    def get(self, member):
+        return self.get_many((member,))[0]
+
+    def get_many(self, members):
+        """
+        Returns the values of ``members``, all taken from the same snapshot if they belong to the same group.
+        """
+        with self._lock:
+            now = time.time()
+            stale = set()
+            for member in members:
+                key = self._key(member)
+                if key in self._times and (member in self._static_members or now - self._times[key] <= self.ttl):
+                    self._hits[member] += 1
+                else:
+                    self._misses[member] += 1
+                    stale.add(key)
+            for key in stale:
+                self._refresh(key, now)
+
+            values = []
+            for member in members:
+                value = self._values[member]
+                if isinstance(value, _Failed):
+                    raise value.exception
+                values.append(value)
+            return tuple(values)
+
+    def _key(self, member):
+        return self._group_of.get(member, (member,))
+
+    def _refresh(self, key, now):
+        driver = self.driver()
+        for member in key:
+            self._reads += 1
+            try:
+                self._values[member] = getattr(driver, member)
+            except Exception, e:
+                self._values[member] = _Failed(e)
+        if key[0] in self._group_of or key[0] in self._static_members:
+            self._times[key] = now
+
+    def feed(self, timestamp, values):
+        """
+        Stores property values read elsewhere (e.g. by a telemetry poller) as a snapshot taken at ``timestamp``. Only
+        groups with all their members in ``values`` are refreshed, and not with values read before their last
+        invalidation.
+        """
+        with self._lock:
+            for key in set(self._key(member) for member in values):
+                if timestamp < self._invalidated.get(key, 0):
+                    continue
+                if key[0] in self._group_of and all(member in values for member in key):
+                    self._values.update((member, values[member]) for member in key)
+                    self._times[key] = max(timestamp, self._times.get(key, 0))
+
+    def invalidate(self, static=False):
+        """
+        Forces the next reads to go to the driver, after commands that change the state or on reconnections.
+        """
+        with self._lock:
+            now = time.time()
+            for key in set(self._group_of.itervalues()) | set(self._times):
+                if static or key[0] not in self._static_members:
+                    self._times.pop(key, None)
+                    self._invalidated[key] = now
+
+    def stats(self):
+        """
+        :return: hits and misses per member and driver reads per second since creation.
+        """
+        with self._lock:
+            members = set(self._hits) | set(self._misses)
+            return {"properties": dict((m, {"hits": self._hits[m], "misses": self._misses[m]}) for m in members),
+                    "driver_reads": self._reads,
+                    "driver_reads_per_second": self._reads / max(time.time() - self._t0, 1e-6)}
+
+
+class SetterCache(object):
+    """
+    Write-through cache of driver settings: a value is only written if it differs from the last value written.
+    Any write error forgets everything, as the device state is then unknown.
+
+    :param driver: callable returning the current driver object.
+    """
+
+    def __init__(self, driver):
+        self.driver = driver
+        self.writes = 0
+        self.skipped = 0
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, member, value):
+        """
+        :return: True if the value was written to the driver.
+        """
+        with self._lock:
+            if member in self._values and self._values[member] == value:
+                self.skipped += 1
+                return False
+            try:
+                setattr(self.driver(), member, value)
+            except Exception:
+                self._values.clear()
+                raise
+            self._values[member] = value
+            self.writes += 1
+            return True
+
+    def invalidate(self):
+        with self._lock:
+            self._values.clear()
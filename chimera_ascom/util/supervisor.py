@@ -0,0 +1,173 @@
+import time
+import logging
+import threading
+
+from chimera_ascom.util.driver import TELEMETRY
+from chimera_ascom.util.transport import initialize_thread, DriverTimeout
+
+log = logging.getLogger(__name__)
+
+
+class ConnectionFailed(Exception):
+    pass
+
+
+class ConnectionSupervisor(object):
+    """
+    Connects a driver and keeps it connected, without ever showing a setup dialog.
+
+    The link is checked reading ``link`` (Connected, or Link for old focusers) every ``interval`` seconds and as soon
+    as ``failures`` driver calls failed in a row. Periodic checks are skipped while a driver call is running, and a
+    check waiting behind a running call doesn't count as lost: long calls (a synchronous slew, a readout) are not a
+    dead link, only failed calls or an unanswered check on an idle driver thread are. A dead link is reconnected on
+    a fresh driver thread (a hung call can't block it), retrying with a backoff doubling from ``backoff`` to
+    ``max_backoff`` seconds until it works; ``restore()`` then reapplies the settings the instrument keeps (geometry,
+    cooler setpoint, tracking...).
+
+    :param driver: DriverThread of the instrument.
+    :param factory: callable creating the driver object, run on the driver thread.
+    """
+
+    def __init__(self, name, driver, factory, link="Connected", restore=None, interval=10, attempts=3, backoff=1.,
+                 max_backoff=60., failures=3):
+        self.name = name
+        self.driver = driver
+        self.factory = factory
+        self.link = link
+        self.restore = restore
+        self.interval = interval
+        self.attempts = attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.failures = failures
+        self._connected = False
+        self._reconnects = 0
+        self._downtime = 0.
+        self._down_since = None
+        self._last_error = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def connect(self):
+        """
+        Creates and connects the driver, trying ``attempts`` times with backoff.
+
+        :raises ConnectionFailed: if every attempt failed.
+        """
+        wait = self.backoff
+        for attempt in range(1, self.attempts + 1):
+            try:
+                self._open()
+                return
+            except Exception, e:
+                self._last_error = str(e)
+                log.warning("%s: connection attempt %d of %d failed: %s" % (self.name, attempt, self.attempts, e))
+            if attempt < self.attempts:
+                time.sleep(wait)
+                wait = min(2 * wait, self.max_backoff)
+        raise ConnectionFailed("Could not connect to %s after %d tries: %s" %
+                               (self.name, self.attempts, self._last_error))
+
+    def _open(self):
+        self.driver.open(self.factory)
+        self.driver.call(lambda: setattr(self.driver.driver, self.link, True), member=self.link)
+        self._connected = True
+
+    def start(self):
+        """
+        Starts watching the link, with ``interval`` 0 the link is only checked after failed calls.
+        """
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self.driver.on_error = self._onError
+        self._thread = threading.Thread(target=self._run, name="Supervisor %s" % self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self.driver.on_error = None
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(self.max_backoff + 1)
+            self._thread = None
+
+    def isConnected(self):
+        return self._connected
+
+    def stats(self):
+        """
+        :return: whether connected, reconnections done, total downtime and current downtime in seconds, last error.
+        """
+        current = time.time() - self._down_since if self._down_since is not None else 0.
+        return {"connected": self._connected, "reconnects": self._reconnects, "downtime": self._downtime + current,
+                "down_for": current, "last_error": self._last_error}
+
+    def _onError(self, error):
+        if self.driver.errors_in_row >= self.failures:
+            self._wake.set()
+
+    def _elsewhere(self):
+        """
+        :return: whether the driver thread is running a call other than a link check.
+        """
+        running = self.driver.busy()
+        return running is not None and running[0] != self.link
+
+    def _alive(self, failed=False):
+        """
+        :param failed: driver calls failed in a row, check even if the driver thread is busy.
+        """
+        if not failed and self._elsewhere():
+            return True
+        try:
+            return bool(self.driver.call(lambda: getattr(self.driver.driver, self.link), TELEMETRY,
+                                         timeout=max(self.interval, 5), member=self.link))
+        except DriverTimeout, e:
+            if self._elsewhere():  # queued behind a long call, not hung
+                return True
+            self._last_error = str(e)
+            return False
+        except Exception, e:
+            self._last_error = str(e)
+            return False
+
+    def _run(self):
+        initialize_thread()
+        while not self._stop.isSet():
+            self._wake.wait(self.interval if self.interval > 0 else None)
+            self._wake.clear()
+            if self._stop.isSet():
+                return
+            if self._alive(self.driver.errors_in_row >= self.failures):
+                continue
+            self._reconnect()
+
+    def _reconnect(self):
+        self._connected = False
+        self._down_since = time.time()
+        log.error("%s: driver link lost (%s), reconnecting." % (self.name, self._last_error))
+        wait = self.backoff
+        while not self._stop.isSet():
+            self.driver.reset()
+            try:
+                self._open()
+                if self.restore is not None:
+                    self.restore()
+                break
+            except Exception, e:
+                self._connected = False
+                self._last_error = str(e)
+                log.warning("%s: reconnection failed, next try in %.1f s: %s" % (self.name, wait, e))
+            self._stop.wait(wait)
+            wait = min(2 * wait, self.max_backoff)
+        else:
+            return
+
+        downtime = time.time() - self._down_since
+        self._downtime += downtime
+        self._down_since = None
+        self._reconnects += 1
+        log.info("%s: reconnected after %.1f s." % (self.name, downtime))
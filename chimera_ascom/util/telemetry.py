@@ -0,0 +1,150 @@
+import time
+import logging
+import threading
+
+import numpy as np
+
+from chimera_ascom.util.transport import initialize_thread
+
+log = logging.getLogger(__name__)
+
+
+class TelemetryBuffer(object):
+    """
+    Fixed-size ring buffer of timestamped samples of numeric (or boolean) driver properties.
+
+    :param members: names of the properties of each sample.
+    :param size: number of samples kept, older samples are overwritten.
+    """
+
+    def __init__(self, members, size=3600):
+        self.members = tuple(members)
+        self.size = size
+        self._times = np.zeros(size)
+        self._values = np.empty((size, len(self.members)))
+        self._values.fill(np.nan)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def append(self, timestamp, values):
+        """
+        :param values: {member: value}, missing or non numeric values are stored as NaN.
+        """
+        row = [_number(values.get(member)) for member in self.members]
+        with self._lock:
+            i = self._count % self.size
+            self._times[i] = timestamp
+            self._values[i] = row
+            self._count += 1
+
+    def latest(self):
+        """
+        :return: (timestamp, {member: value}) of the newest sample, (None, {}) if empty.
+        """
+        with self._lock:
+            if not self._count:
+                return None, {}
+            i = (self._count - 1) % self.size
+            return self._times[i], dict(zip(self.members, self._values[i].tolist()))
+
+    def since(self, timestamp=None):
+        """
+        :return: {"time": [...], member: [...]} of the samples newer than ``timestamp``, oldest first.
+        """
+        with self._lock:
+            n = min(self._count, self.size)
+            order = np.arange(self._count - n, self._count) % self.size
+            times = self._times[order]
+            values = self._values[order]
+        if timestamp is not None:
+            newer = times > timestamp
+            times, values = times[newer], values[newer]
+        result = dict((member, values[:, j].tolist()) for j, member in enumerate(self.members))
+        result["time"] = times.tolist()
+        return result
+
+
+class TelemetryPoller(object):
+    """
+    Polls a set of driver properties every ``cadence`` seconds on a single thread and keeps them on a
+    TelemetryBuffer, so that any number of clients costs the driver one poll stream.
+
+    :param driver: callable returning the current driver object.
+    :param on_sample: optional callable(timestamp, values) called after each poll.
+    """
+
+    def __init__(self, name, driver, members, cadence=1.0, size=3600, on_sample=None):
+        self.name = name
+        self.driver = driver
+        self.cadence = cadence
+        self.buffer = TelemetryBuffer(members, size)
+        self.on_sample = on_sample
+        self._invalidated = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self.cadence <= 0 or self.isRunning():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="Telemetry %s" % self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(self.cadence + 1)
+            self._thread = None
+
+    def isRunning(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def value(self, member, fallback):
+        """
+        Returns the newest sample of ``member`` if it is at most two poll periods old and taken after the last
+        ``invalidate()``, else ``fallback()``.
+        """
+        timestamp, values = self.buffer.latest()
+        if (self.isRunning() and timestamp and timestamp >= self._invalidated and
+                time.time() - timestamp <= 2 * self.cadence):
+            value = values.get(member)
+            if value is not None and not np.isnan(value):
+                return value
+        return fallback()
+
+    def invalidate(self):
+        """
+        Makes ``value`` ignore the samples polled until now, to be called after commands that change the polled
+        properties: reads then see the state after the command.
+        """
+        self._invalidated = time.time()
+
+    def since(self, timestamp=None):
+        return self.buffer.since(timestamp)
+
+    def _run(self):
+        initialize_thread()
+        while not self._stop.isSet():
+            t0 = time.time()
+            driver = self.driver()
+            values = {}
+            for member in self.buffer.members:
+                try:
+                    values[member] = getattr(driver, member)
+                except Exception, e:
+                    log.debug("%s: could not poll %s: %s" % (self.name, member, e))
+            self.buffer.append(t0, values)
+            if self.on_sample is not None:
+                try:
+                    self.on_sample(t0, values)
+                except Exception:
+                    log.exception("%s: telemetry callback failed" % self.name)
+            self._stop.wait(max(0, self.cadence - (time.time() - t0)))
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
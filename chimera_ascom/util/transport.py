@@ -0,0 +1,319 @@
+# Based on https://ascom-standards.org/api/ and https://ascom-standards.org/Developer/AlpacaImageBytes.pdf
+
+import sys
+import json
+import socket
+import struct
+import urllib
+import logging
+import httplib
+import threading
+import itertools
+import Queue
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+if sys.platform == "win32":
+    sys.coinit_flags = 0
+    import pythoncom
+    from win32com.client import Dispatch
+    from pywintypes import com_error
+else:
+    pythoncom = None
+    log.warning("Not on Windows. Only the ASCOM Alpaca transport will work.")
+    Dispatch = None
+
+    class com_error(Exception):
+        pass
+
+
+class AlpacaError(Exception):
+    def __init__(self, number, message):
+        Exception.__init__(self, "Alpaca error 0x%x: %s" % (number, message))
+        self.number = number
+
+
+class AlpacaNotImplemented(AlpacaError, AttributeError):
+    """
+    Raised for members the device doesn't implement, so that it is handled like a missing member on a COM driver.
+    """
+    pass
+
+
+class DriverTimeout(EnvironmentError):
+    """
+    Raised when a driver call doesn't complete in time.
+    """
+    pass
+
+
+#: exceptions of a lost or slow link to the driver, rather than of the driver itself.
+LINK_ERRORS = (DriverTimeout, socket.error, httplib.HTTPException)
+
+#: exceptions raised by driver calls, whatever the transport.
+DRIVER_ERRORS = (com_error, AlpacaError) + LINK_ERRORS
+
+ALPACA_NOT_IMPLEMENTED = 0x400
+
+#: ImageBytes element types.
+IMAGEBYTES_TYPES = {1: '<i2', 2: '<i4', 3: '<f8', 4: '<f4', 5: '<u8', 6: '|u1', 7: '<i8', 8: '<u2', 9: '<u4'}
+
+
+def dispatch(instrument, device_type):
+    """
+    Returns the driver object of a chimera instrument, according to its ``transport`` configuration: "com" uses
+    the Windows COM driver ``ascom_id``, "alpaca" the device ``alpaca_device`` of the Alpaca server
+    ``alpaca_server`` (host:port) and "sim" a simulated device (see chimera_ascom.sim.devices). Cameras read images
+    in the ImageBytes format unless ``alpaca_imagebytes`` is False. Alpaca requests time out after
+    ``driver_timeout`` seconds.
+
+    :param device_type: Alpaca device type: telescope, camera, focuser or filterwheel.
+    """
+    transport = instrument["transport"].lower()
+    if transport == "com":
+        if Dispatch is None:
+            raise EnvironmentError("ASCOM COM transport is only available on Windows.")
+        return Dispatch(instrument["ascom_id"])
+    elif transport == "alpaca":
+        host, port = instrument["alpaca_server"].rsplit(":", 1)
+        imagebytes = instrument["alpaca_imagebytes"] if device_type == "camera" else False
+        return AlpacaDevice(ConnectionPool.get(host, int(port)), device_type, int(instrument["alpaca_device"]),
+                            imagebytes=imagebytes, timeout=instrument["driver_timeout"])
+    elif transport == "sim":
+        from chimera_ascom.sim import devices  # only loaded when simulating
+        return devices.create(device_type)
+    raise ValueError("Unknown ASCOM transport '%s'." % instrument["transport"])
+
+
+def initialize_thread():
+    """
+    Must be called by every thread that calls COM drivers, other than the one that imported this module.
+    """
+    if pythoncom is not None:
+        pythoncom.CoInitializeEx(pythoncom.COINIT_MULTITHREADED)
+
+
+def device_name(instrument, device_type):
+    """
+    Returns an unique name of the device of a chimera instrument, whatever the transport.
+    """
+    if instrument["transport"].lower() == "alpaca":
+        return "alpaca://%s/%s/%d" % (instrument["alpaca_server"], device_type, int(instrument["alpaca_device"]))
+    return instrument["ascom_id"]
+
+
+class ConnectionPool(object):
+    """
+    Keep-alive HTTP connections to an Alpaca server, shared by every device of that server. Up to ``size`` idle
+    connections are kept open, 0 disables keep-alive. ``timeout`` is the default socket timeout of the requests.
+    """
+
+    _pools = {}
+    _pools_lock = threading.Lock()
+
+    @classmethod
+    def get(cls, host, port):
+        with cls._pools_lock:
+            if (host, port) not in cls._pools:
+                cls._pools[(host, port)] = cls(host, port)
+            return cls._pools[(host, port)]
+
+    def __init__(self, host, port, size=4, timeout=30):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.timeout = timeout
+        self._idle = Queue.LifoQueue(size)
+
+    def request(self, method, path, body=None, headers=None, timeout=None):
+        """
+        Sends a request, reusing an idle connection if there is one. It is sent again only when a reused
+        connection turns out to be closed by the server, never after a timeout.
+
+        :param timeout: socket timeout in seconds, default ``self.timeout``.
+        :return: (status, content type, body) of the response.
+        :raises DriverTimeout: if the server doesn't answer in time.
+        """
+        headers = headers or {}
+        timeout = self.timeout if timeout is None else timeout
+        while True:
+            try:
+                conn, reused = self._idle.get_nowait(), True
+                conn.timeout = timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(timeout)
+            except Queue.Empty:
+                conn, reused = httplib.HTTPConnection(self.host, self.port, timeout=timeout), False
+            try:
+                conn.request(method, path, body, headers)
+                response = conn.getresponse()
+                data = response.read()
+            except socket.timeout:
+                conn.close()  # the server may still run the request, never sent twice
+                raise DriverTimeout("%s %s: no answer from %s:%d after %.1f s." %
+                                    (method, path, self.host, self.port, timeout))
+            except (httplib.HTTPException, socket.error):
+                conn.close()
+                if reused:  # the server closed this idle connection, try the next one
+                    continue
+                raise
+
+            if not self.size or response.getheader("connection", "").lower() == "close":
+                conn.close()
+            else:
+                try:
+                    self._idle.put_nowait(conn)
+                except Queue.Full:
+                    conn.close()
+            return response.status, response.getheader("content-type", ""), data
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+
+
+class AlpacaDevice(object):
+    """
+    Alpaca device with the same interface as the COM driver objects: properties are read and written as attributes
+    and driver methods are called as methods.
+    """
+
+    #: driver methods and their Alpaca parameter names, everything else is a property.
+    methods = {"common": {"Action": ("Action", "Parameters"),
+                          "CommandBlind": ("Command", "Raw"),
+                          "CommandBool": ("Command", "Raw"),
+                          "CommandString": ("Command", "Raw")},
+               "camera": {"StartExposure": ("Duration", "Light"),
+                          "StopExposure": (),
+                          "AbortExposure": (),
+                          "PulseGuide": ("Direction", "Duration")},
+               "telescope": {"SlewToCoordinates": ("RightAscension", "Declination"),
+                             "SlewToCoordinatesAsync": ("RightAscension", "Declination"),
+                             "SlewToAltAz": ("Azimuth", "Altitude"),
+                             "SlewToAltAzAsync": ("Azimuth", "Altitude"),
+                             "SyncToCoordinates": ("RightAscension", "Declination"),
+                             "MoveAxis": ("Axis", "Rate"),
+                             "PulseGuide": ("Direction", "Duration"),
+                             "AbortSlew": (),
+                             "Park": (),
+                             "Unpark": (),
+                             "SetPark": (),
+                             "FindHome": ()},
+               "focuser": {"Move": ("Position",),
+                           "Halt": ()},
+               "filterwheel": {}}
+
+    #: COM members with another name on Alpaca.
+    aliases = {"Link": "Connected"}
+
+    _client_id = 0
+    _transaction_ids = itertools.count(1)
+
+    def __init__(self, pool, device_type, device_number=0, imagebytes=True, timeout=None):
+        self.__dict__.update(_pool=pool, _type=device_type, _imagebytes=imagebytes, _timeout=timeout,
+                             _path="/api/v1/%s/%d/" % (device_type, device_number),
+                             _methods=dict(self.methods["common"], **self.methods[device_type]))
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        if name in self._methods:
+            return lambda *args: self._call(name, args)
+        if name in ("ImageArray", "ImageArrayVariant"):
+            return self._image(name)
+        return self._get(self.aliases.get(name, name))[0]
+
+    def __setattr__(self, name, value):
+        if name.startswith("_"):
+            self.__dict__[name] = value
+        else:
+            name = self.aliases.get(name, name)
+            self._put(name, {name: value})
+
+    def SetupDialog(self):
+        log.warning("Alpaca devices are set up on the server web page, not by SetupDialog.")
+
+    def Dispose(self):
+        pass
+
+    def _call(self, name, args):
+        params = self._methods[name]
+        if len(args) != len(params):
+            raise TypeError("%s takes %d arguments (%d given)" % (name, len(params), len(args)))
+        return self._put(name, dict(zip(params, args)))
+
+    def _get(self, member, accept="application/json"):
+        """
+        :return: (value, raw) where value is None and raw the response body for ImageBytes responses.
+        """
+        status, content_type, data = self._pool.request("GET", self._path + member.lower() + "?" +
+                                                        urllib.urlencode(self._ids()), headers={"Accept": accept},
+                                                        timeout=self._timeout)
+        if status == 200 and content_type.startswith("application/imagebytes"):
+            return None, data
+        return self._value(member, status, data), None
+
+    def _put(self, member, params):
+        params = dict(self._ids(), **dict((k, _format(v)) for k, v in params.iteritems()))
+        status, content_type, data = self._pool.request(
+            "PUT", self._path + member.lower(), urllib.urlencode(params),
+            {"Content-Type": "application/x-www-form-urlencoded"}, self._timeout)
+        return self._value(member, status, data)
+
+    def _image(self, member):
+        accept = "application/imagebytes" if self._imagebytes else "application/json"
+        value, raw = self._get(member, accept)
+        if raw is not None:
+            return parse_imagebytes(raw)
+        # JSON image: nested [x][y] lists, read by ImageReader like a COM SAFEARRAY.
+        return value
+
+    def _value(self, member, status, data):
+        if status != 200:
+            raise AlpacaError(status, "%s%s: %s" % (self._path, member.lower(), data.strip()))
+        response = json.loads(data)
+        if response.get("ErrorNumber", 0):
+            number, message = response["ErrorNumber"], response.get("ErrorMessage", "")
+            if number == ALPACA_NOT_IMPLEMENTED:
+                raise AlpacaNotImplemented(number, message)
+            raise AlpacaError(number, message)
+        return response.get("Value")
+
+    def _ids(self):
+        return {"ClientID": self._client_id, "ClientTransactionID": next(self._transaction_ids)}
+
+    def __repr__(self):
+        return "<AlpacaDevice %s:%d%s>" % (self._pool.host, self._pool.port, self._path)
+
+
+def _format(value):
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return value
+
+
+def parse_imagebytes(data):
+    """
+    Parses an Alpaca ImageBytes response without copying the pixels.
+
+    :return: read-only numpy array indexed [x][y] like ImageArray.
+    """
+    (version, error, client_tid, server_tid, data_start, image_type, transmission_type,
+     rank, dim1, dim2, dim3) = struct.unpack_from("<11i", data)
+    if error:
+        raise AlpacaError(error, data[data_start:].decode("utf-8"))
+    shape = (dim1, dim2) if rank == 2 else (dim1, dim2, dim3)
+    return np.frombuffer(data, dtype=IMAGEBYTES_TYPES[transmission_type], offset=data_start).reshape(shape)
+
+
+def make_imagebytes(image, client_tid=0, server_tid=0):
+    """
+    Builds an Alpaca ImageBytes response from an [x][y] numpy image (used by the stand-in Alpaca server).
+    """
+    image = np.ascontiguousarray(image, dtype=np.dtype(image.dtype).newbyteorder("<"))
+    code = dict((v, k) for k, v in IMAGEBYTES_TYPES.iteritems())[image.dtype.str]
+    dims = list(image.shape) + [0] * (3 - image.ndim)
+    header = struct.pack("<11i", 1, 0, client_tid, server_tid, 44, code, code, image.ndim, *dims)
+    return header + image.tostring()
@@ -0,0 +1,85 @@
+import time
+import logging
+import threading
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+class FrameRing(object):
+    """
+    Ring buffer of ``size`` preallocated frames for continuous acquisition: the reader fills ``slot()`` in place and
+    calls ``commit``, no array is allocated per frame. Subscribers are called on the acquisition thread with a view
+    of the frame, valid until the ring wraps around; they must copy what they keep.
+
+    :param shape: (NumY, NumX) of the frames.
+    """
+
+    def __init__(self, shape, dtype=np.uint16, size=8):
+        self.shape = tuple(shape)
+        self.size = size
+        self._frames = np.zeros((size,) + self.shape, dtype=dtype)
+        self._times = np.zeros(size)
+        self._count = 0
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def slot(self):
+        """
+        :return: the array the next frame must be read into.
+        """
+        return self._frames[self._count % self.size]
+
+    def commit(self, timestamp=None):
+        """
+        Publishes the frame read into ``slot()`` and calls the subscribers.
+        """
+        with self._lock:
+            i = self._count % self.size
+            self._times[i] = time.time() if timestamp is None else timestamp
+            self._count += 1
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(self._count - 1, self._times[i], self._frames[i])
+            except Exception:
+                log.exception("Video subscriber %s failed" % callback)
+
+    def subscribe(self, callback):
+        """
+        :param callback: callable(number, timestamp, frame) called for every new frame.
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    @property
+    def count(self):
+        return self._count
+
+    def latest(self):
+        """
+        :return: (number, timestamp, copy of the frame) of the newest frame, (None, None, None) if empty.
+        """
+        with self._lock:
+            if not self._count:
+                return None, None, None
+            i = (self._count - 1) % self.size
+            return self._count - 1, self._times[i], self._frames[i].copy()
+
+    def fps(self):
+        """
+        :return: frame rate over the frames in the ring, 0 with less than two frames.
+        """
+        with self._lock:
+            n = min(self._count, self.size)
+            if n < 2:
+                return 0.
+            first = self._times[(self._count - n) % self.size]
+            last = self._times[(self._count - 1) % self.size]
+        return (n - 1) / (last - first) if last > first else 0.
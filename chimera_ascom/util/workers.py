@@ -0,0 +1,66 @@
+import logging
+import threading
+import Queue
+
+from chimera_ascom.util.operation import Operation
+from chimera_ascom.util.transport import initialize_thread
+
+log = logging.getLogger(__name__)
+
+
+class WorkerPool(object):
+    """
+    Threads running submitted jobs in submission order. The queue is bounded, so producers block on ``submit``
+    instead of piling up frames in memory when the workers fall behind.
+
+    :param workers: number of threads.
+    :param depth: maximum number of jobs waiting for a worker.
+    """
+
+    def __init__(self, name, workers=1, depth=2):
+        self.name = name
+        self.max_pending = 0
+        self._queue = Queue.Queue(max(depth, 1))
+        self._threads = []
+        for i in range(workers):
+            thread = threading.Thread(target=self._run, name="%s worker %d" % (name, i))
+            thread.daemon = True
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, func, *args):
+        """
+        Queues ``func(*args)``, blocking while the queue is full.
+
+        :return: Operation finished with the result of the job.
+        """
+        operation = Operation("%s: %s" % (self.name, getattr(func, "__name__", func)))
+        self._queue.put((operation, func, args))
+        self.max_pending = max(self.max_pending, self._queue.qsize())
+        return operation
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def shutdown(self):
+        """
+        Stops the workers after the jobs already queued.
+        """
+        for thread in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def _run(self):
+        initialize_thread()
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            operation, func, args = job
+            try:
+                operation.finish(func(*args))
+            except Exception, e:
+                log.exception("%s failed" % operation.name)
+                operation.finish(error=e)
@@ -3,7 +3,8 @@ from distutils.core import setup
 setup(
     name='chimera_ascom',
     version='0.0.1',
-    packages=['chimera_ascom', 'chimera_ascom.instruments'],
+    packages=['chimera_ascom', 'chimera_ascom.instruments', 'chimera_ascom.util', 'chimera_ascom.sim',
+              'chimera_ascom.controllers'],
     url='http://github.com/astroufsc/chimera-ascom',
     license='GPL v2',
     author='William Schoenell',